@@ -0,0 +1,101 @@
+from copy import deepcopy
+from itertools import combinations, product
+from decorators import traced
+from SudokuSolver import SudokuSolver
+
+
+class BoardRepairer(object):
+    """ Repairs OCR misreads in the starting board found by an
+        ImageExtractor, without running OCR on the whole grid again.
+
+        When the board breaks the rules of sudoku, or does not have exactly
+        one solution, a few suspect squares are selected: the squares
+        involved in a conflict, followed by the squares the OCR engine was
+        least confident about. Only those squares are read again with
+        stronger preprocessing. The solver then decides which combination
+        of alternative readings (or leaving a square empty) results in a
+        board with exactly one solution, preferring the fewest changes.
+
+        Usage:
+            board = BoardRepairer(extracted_info).repair()
+            if board is None:
+                # The board could not be repaired """
+
+    def __init__(self, extractor):
+        ''' Initializer for the BoardRepairer object. Requires the
+            ImageExtractor that read the board, whose settings are used. '''
+        self.extractor = extractor
+        self.config = extractor.config
+        self.board = deepcopy(extractor.starting_grid)
+
+    @traced("repair")
+    def repair(self):
+        ''' Returns the starting board if it is valid and has exactly one
+            solution. Otherwise returns a repaired copy of the board, or
+            None if no repair was found. '''
+        solver = SudokuSolver(self.board, debug=self.config.enable_debug)
+        conflicts = solver.conflicting_cells()
+        if not conflicts and solver.count_solutions(solver.board) == 1:
+            return self.board
+
+        cells = self.suspect_squares(conflicts)
+        if self.config.enable_debug:
+            print("DEBUG -- Board is invalid or not uniquely solvable."
+                  " Reading squares %s again." % cells)
+        options = self.square_options(cells)
+        for changes in self.candidate_changes(cells, options):
+            board = deepcopy(self.board)
+            for (row, col), value in changes:
+                board[row][col] = value
+            solver = SudokuSolver(board)
+            if (not solver.conflicting_cells() and
+                    solver.count_solutions(solver.board) == 1):
+                if self.config.enable_debug:
+                    print("DEBUG -- Board repaired by changing %s."
+                          % (changes,))
+                return board
+        return None
+
+    def suspect_squares(self, conflicts):
+        ''' Returns the squares to read again: all squares involved in a
+            conflict, followed by the squares with an OCR confidence below
+            MIN_OCR_CONFIDENCE. Filled in squares (least confident first)
+            come before empty squares, which only have a confidence when
+            text that is not a digit was found, so noise in blank squares
+            does not push misread digits out of the limit.
+            At most MAX_REREAD_SQUARES squares are returned. '''
+        confidences = self.extractor.square_confidences
+        unsure = [(self.board[row][col] == 0, confidences[row][col],
+                   (row, col))
+                  for row in range(9) for col in range(9)
+                  if (row, col) not in conflicts and
+                  confidences[row][col] is not None and
+                  confidences[row][col] < self.config.min_ocr_confidence]
+        unsure.sort()
+        cells = list(conflicts) + [cell for _, _, cell in unsure]
+        return cells[:self.config.max_reread_squares]
+
+    def square_options(self, cells):
+        ''' Returns the alternative values per square: the values found
+            when reading the square again (most confident first), followed
+            by 0 (an empty square). The current value is left out. '''
+        readings = self.extractor.reread_squares(cells)
+        options = {}
+        for row, col in cells:
+            ranked = sorted(readings[(row, col)],
+                            key=lambda reading: -(reading[1] or 0))
+            values = []
+            for value, _ in ranked + [(0, None)]:
+                if value != self.board[row][col] and value not in values:
+                    values.append(value)
+            options[(row, col)] = values
+        return options
+
+    def candidate_changes(self, cells, options):
+        ''' Generates lists of ((row, col), value) changes to the board,
+            starting with every single change, then every pair of changes
+            and so on, up to MAX_REPAIR_CHANGES changes. '''
+        for amount in range(1, self.config.max_repair_changes + 1):
+            for changed in combinations(cells, amount):
+                for values in product(*[options[cell] for cell in changed]):
+                    yield list(zip(changed, values))
@@ -1,100 +1,51 @@
-import cv2
-from settings import (BLUR_KERNEL_SIZE, ENABLE_PREVIEW, ENABLE_DEBUG,
-                      ENABLE_PREVIEW_ALL, ENABLE_OCR_DEBUG, VERBOSE_EXIT)
+from settings import load_config
+from errors import GridNotFoundError
 
-from decorators import check_debug
+from decorators import traced
 from helper_functions import image_preview
-from sys import exit
+from lazy_imports import lazy_import
+from ImageProcessor import ImageProcessor
 from copy import deepcopy
-import numpy as np
-import pytesseract  # Wrapper to Tesseract OCR engine
+
+# Heavy dependencies are only imported when the image is processed
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+pytesseract = lazy_import('pytesseract')  # Wrapper to Tesseract OCR engine
 # Python Image Library to convert image so Tesseract can understand the format
-from PIL import Image
+Image = lazy_import('PIL.Image')
 
-DEV_EMAIL = "st.boonstra@st.hanze.nl"
+# Tesseract configuration: treat the image as a single character (digit)
+OCR_CONFIG = '--tessdata-dir /usr/share/tesseract-ocr -psm 10 digits'
 
 
-class ImageExtractor(object):
+class ImageExtractor(ImageProcessor):
     """ This class contains all the methods, functions and algorithms
     to extract valuable data from a given image. This class is used to
     perform operations on the image, as well as grabbing the values from
     the image using OCR and storing it as a list. """
 
-    def __init__(self, image):
+    def __init__(self, image, grid_contour=None, config=None):
+        # The settings to use, defaults to the settings in settings.py
+        self.config = config or load_config()
         self.original_image = image  # The original image from the user
-        self.grayscale = self.to_grayscale(image)  # Grayscale version of image
-        # Apply gaussian blur to grayscale image
-        self.blurred = self.apply_blur(self.grayscale)
-        self.thresh = self.to_binary(self.blurred)
-        self.biggest_contour = self.find_grid(self.thresh)
+        if grid_contour is None:
+            # Grayscale version of image
+            self.grayscale = self.to_grayscale(image)
+            # Apply gaussian blur to grayscale image
+            self.blurred = self.apply_blur(self.grayscale)
+            self.thresh = self.to_binary(self.blurred)
+            self.biggest_contour = self.find_grid(self.thresh)
+        else:
+            # The grid was already found in the image (see PageExtractor)
+            self.grayscale = self.blurred = self.thresh = None
+            self.biggest_contour = grid_contour
         self.warp = self.extract_grid(self.biggest_contour,
                                       self.original_image)
         self.square_borders = self.calc_square_borders(self.warp)
         self.starting_grid = self.extract_sudoku_values(self.warp,
                                                         self.square_borders)
 
-    @check_debug
-    def to_grayscale(self, image):
-        """ Transform the given image to grayscale """
-        if ENABLE_DEBUG:
-            print("DEBUG -- Attempting to transform image to grayscale.")
-        try:
-            grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        except:
-            if VERBOSE_EXIT:
-                print("ERROR -- Could not convert image to grayscale.")
-            exit()
-        if ENABLE_PREVIEW_ALL:
-            image_preview(grayscale)
-        if ENABLE_DEBUG:
-            print("DEBUG -- Image succesfully converted to grayscale.")
-        return grayscale
-
-    @check_debug
-    def apply_blur(self, image):
-        """ Adds a blur to the given image, using the kernel size
-            defined in settings. """
-        if ENABLE_DEBUG:
-            print("DEBUG -- Attempting to apply gaussian blur to"
-                  " grayscale image.")
-        try:
-            blurred = cv2.GaussianBlur(src=image,
-                                       ksize=BLUR_KERNEL_SIZE,
-                                       sigmaX=0)
-        except:
-            if VERBOSE_EXIT:
-                print("ERROR -- Could not apply blur filter. Please check"
-                      " settings and consider changing the blur kernel size.")
-            exit()
-        if ENABLE_PREVIEW_ALL:
-            image_preview(blurred)
-        if ENABLE_DEBUG:
-            print("DEBUG -- Gaussian Blur succesfully applied.")
-        return blurred
-
-    @check_debug
-    def to_binary(self, image):
-        """ This method uses Adaptive Thresholding to convert
-            a blurred grayscale image to binary (only black and white).
-            The binary image is required to extract the full sudoku grid
-            from the image. """
-        if ENABLE_DEBUG:
-                print("DEBUG -- Attempting to apply adaptive threshold"
-                      " and convert image to black and white.")
-        try:
-            thresh = cv2.adaptiveThreshold(image, 255, 1, 1, 11, 2)
-        except:
-            if VERBOSE_EXIT:
-                print("ERROR -- Unable to convert the image to black/white."
-                      " Please contact the developer at %s and include this"
-                      " error and the image you are using." % DEV_EMAIL)
-            exit()
-        if ENABLE_PREVIEW or ENABLE_PREVIEW_ALL:
-            image_preview(thresh)
-        if ENABLE_DEBUG:
-            print("DEBUG -- Image succesfully converted to binary.")
-        return thresh
-
+    @traced("filter_square")
     def apply_filters(self, image, denoise=False):
         """ This method is used to apply required filters to the
             to extracted regions of interest. Every square in a
@@ -105,7 +56,8 @@ class ImageExtractor(object):
         # Denoise the grayscale image if requested in the params
         if denoise:
             denoised_gray = cv2.fastNlMeansDenoising(source_gray, None, 9, 13)
-            source_blur = cv2.GaussianBlur(denoised_gray, BLUR_KERNEL_SIZE, 3)
+            source_blur = cv2.GaussianBlur(denoised_gray,
+                                           self.config.blur_kernel_size, 3)
             # source_blur = denoised_gray
         else:
             source_blur = cv2.GaussianBlur(source_gray, (3, 3), 3)
@@ -113,14 +65,14 @@ class ImageExtractor(object):
         kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
         source_eroded = cv2.erode(source_thresh, kernel, iterations=1)
         source_dilated = cv2.dilate(source_eroded, kernel, iterations=1)
-        if ENABLE_PREVIEW_ALL:
+        if self.config.enable_preview_all:
             image_preview(source_dilated)
         return source_dilated
 
-    @check_debug
+    @traced("find_grid")
     def find_grid(self, image):
         """ Extract the sudoku grid from the black/white image. """
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Attempting to extract the sudoku grid"
                   " from the image.")
         # Find all the closed shapes in the thresholded image
@@ -164,7 +116,10 @@ class ImageExtractor(object):
                         max_area_found = cur_area
                         # contour_index_found = i
 
-        if ENABLE_PREVIEW or ENABLE_PREVIEW_ALL:
+        if biggest_contour_found is None:
+            raise GridNotFoundError("Could not find a sudoku grid in the"
+                                    " image.")
+        if self.config.enable_preview or self.config.enable_preview_all:
             # To show the biggest contour in the image, it needs
             # to be drawn. So a copy is made of the original image.
             # That way, the original image does not have to be modified
@@ -176,50 +131,17 @@ class ImageExtractor(object):
                 contourIdx=0,
                 color=(255, 0, 0))
             image_preview(_)
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Succesfully found the sudoku grid in"
                   " the image.")
         return biggest_contour_found
 
-    @check_debug
+    @traced("warp")
     def extract_grid(self, contour, image):
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Attempting to extract the sudoku grid from"
                   " the image.")
-        # The corners of the contour (including the curve approximation)
-        # need to be put in clock-wise order (top-left -> top-right
-        # bottom-right -> bottom-left). This is not yet the case so
-        # new corners must be calculated.
-
-        # Reshape the array to look as follows:
-        # array([[0, 0],
-        #        [0, 0],
-        #        [0, 0],
-        #        [0, 0]])
-        points = contour.reshape(4, 2)
-        # Initialize an empty array with zeros,
-        # so that the corner points can be stored later
-        rectangle_corners = np.zeros(
-            (4, 2),
-            dtype="float32")
-
-        points_sum = points.sum(axis=1)
-        # If we look at the SUM of all corners (x, y) pairs, assuming the full
-        # image starts at position 0, 0 at the top-left, we can sum all the
-        # coordinate pairs. Afterward, the most top-left corner will have the
-        # LOWEST sum (closest to 0, 0) and the bottom-right corner will have
-        # the HIGHEST sum (farthest from 0, 0). With this knowledge, we can
-        # already place the x, y coordinates for the top-left and bottom-right
-        # corner in the corner array
-        rectangle_corners[0] = points[np.argmin(points_sum)]
-        rectangle_corners[2] = points[np.argmax(points_sum)]
-
-        # We can sortof do the same for the remaining two corners (top-right
-        # and bottom-left) but by using the DIFFERENCE between (x,y) coordinate
-        # pairs
-        points_difference = np.diff(points, axis=1)
-        rectangle_corners[1] = points[np.argmin(points_difference)]
-        rectangle_corners[3] = points[np.argmax(points_difference)]
+        rectangle_corners = self.order_corners(contour)
 
         # Perspective warping and calculations. Calculates a destination size
         # for the warped image. Code loosely based on the official OpenCV
@@ -267,18 +189,25 @@ class ImageExtractor(object):
         warp = cv2.resize(warp,
                           (450, 450),
                           interpolation=cv2.INTER_AREA)
-        if ENABLE_DEBUG:
+        # Save the full transformation from the image to the 450x450 warp
+        # (perspective transform followed by the resize), so that anything
+        # drawn on the warp can be projected back onto the image.
+        scale = np.array([[450.0 / max_width, 0, 0],
+                          [0, 450.0 / max_height, 0],
+                          [0, 0, 1]])
+        self.warp_matrix = np.dot(scale, pt)
+        if self.config.enable_debug:
             print("DEBUG -- Succesfully extracted the sudoku grid from"
                   " the image.")
-        if ENABLE_PREVIEW or ENABLE_PREVIEW_ALL:
+        if self.config.enable_preview or self.config.enable_preview_all:
             image_preview(warp)
         return warp
 
-    @check_debug
+    @traced("square_borders")
     def calc_square_borders(self, image):
         """ Given a extracted sudoku grid, calculate the borders of
             each individual square of that grid. """
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Attempting to calculate sudoku square borders.")
 
         crop_width = image.shape[1]
@@ -308,10 +237,10 @@ class ImageExtractor(object):
                     x_pointer = 0
                 t = (xs, ys, xe, ye) = x_start, y_start, x_end, y_end
                 square_borders.append(t)
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Succesfully found sudoku square borders.")
 
-        if ENABLE_PREVIEW or ENABLE_PREVIEW_ALL:
+        if self.config.enable_preview or self.config.enable_preview_all:
             _ = deepcopy(image)
             for i, b in enumerate(square_borders):
                 x, y, x2, y2 = b
@@ -320,47 +249,117 @@ class ImageExtractor(object):
 
         return square_borders
 
-    @check_debug
+    @traced("ocr")
     def extract_sudoku_values(self, warp, square_borders):
         """ Uses the transformed image and the Tesseract OCR engine
             to find and store all the values inside the individual
-            sudoku squares. """
-        if ENABLE_DEBUG:
+            sudoku squares. The confidence of the OCR engine for every
+            square is stored in square_confidences. """
+        if self.config.enable_debug:
             print("DEBUG -- Attempting to read and store values"
                   " from within the sudoku grid.")
         # 2D list of number results
         sudoku_start_grid = []
+        # 2D list of OCR confidences, in the same layout as the values
+        self.square_confidences = []
         # Keep track of intermediary rows
         sudoku_row = []
+        confidence_row = []
         # Fetch region of interest, read data with Tesseract OCR Engine
         # and append to start grid
         for i, borders in enumerate(square_borders):
-            x, y, x2, y2 = borders  # Tuple unpacking
-            w = x2 - x  # Determine width
-            h = y2 - y  # Determine height
-            roi = warp[y+6:y2-6, x+6:x2-6]  # Region of interest/individual square
+            roi = self.square_roi(warp, borders)  # Individual square
             roi = self.apply_filters(roi, denoise=True)  # Apply filters to ROI
-            w, h = roi.shape
-            PIL_image = Image.fromarray(roi)
-            value = pytesseract.image_to_string(
-                PIL_image,
-                config='--tessdata-dir /usr/share/tesseract-ocr -psm 10 digits')
-            if ENABLE_OCR_DEBUG:
-                print("DEBUG OCR -- value found: %s" % value)
-            # If a value is found in the square, append the value.
-            if value:
-                sudoku_row.append(int(value))
-            # Otherwise, append a 0.
-            else:
-                sudoku_row.append(0)
+            value, confidence = self.read_square(roi)
+            if self.config.enable_ocr_debug:
+                print("DEBUG OCR -- value found: %s (confidence: %s)"
+                      % (value, confidence))
+            # An empty square is stored as 0
+            sudoku_row.append(value)
+            confidence_row.append(confidence)
             # Each row has 9 values, and each grid has 9 rows.
             # If the row list reached 9, it can be appended to the grid
             if len(sudoku_row) == 9:
                 sudoku_start_grid.append(sudoku_row)
-                if ENABLE_OCR_DEBUG:
+                self.square_confidences.append(confidence_row)
+                if self.config.enable_ocr_debug:
                     print("DEBUG OCR -- Values found in current row:")
                     print(sudoku_row)
                 sudoku_row = []
-        if ENABLE_DEBUG:
+                confidence_row = []
+        if self.config.enable_debug:
             print("DEBUG -- Sudoku values succesfully stored.")
         return sudoku_start_grid
+
+    def square_roi(self, warp, borders):
+        """ Returns the region of interest of a single square: the part
+            of the warped grid within the given borders, without the
+            grid lines around it. """
+        x, y, x2, y2 = borders  # Tuple unpacking
+        return warp[y+6:y2-6, x+6:x2-6]
+
+    @traced("ocr_square")
+    def read_square(self, roi):
+        """ Reads the value of a single filtered sudoku square with
+            the Tesseract OCR engine. Returns the value (0 for an empty
+            square) and the confidence of the OCR engine (0-100). The
+            confidence is None when the installed pytesseract version is
+            unable to report it. """
+        PIL_image = Image.fromarray(roi)
+        if not hasattr(pytesseract, 'image_to_data'):
+            text = pytesseract.image_to_string(PIL_image, config=OCR_CONFIG)
+            return self.parse_ocr_text(text), None
+        data = pytesseract.image_to_data(
+            PIL_image,
+            config=OCR_CONFIG,
+            output_type=pytesseract.Output.DICT)
+        # Keep the reading the OCR engine is most confident about
+        value, confidence = 0, None
+        for text, conf in zip(data['text'], data['conf']):
+            conf = float(conf)
+            if text.strip() and (confidence is None or conf > confidence):
+                value, confidence = self.parse_ocr_text(text), conf
+        if value == 0 and confidence is not None:
+            # Text that is not a single digit is not a reliable reading
+            confidence = 0.0
+        return value, confidence
+
+    def parse_ocr_text(self, text):
+        """ Converts OCR output to a square value. Anything but a single
+            digit in the range 1-9 is considered to be an empty square. """
+        digits = [char for char in text if char in '123456789']
+        if len(digits) == 1:
+            return int(digits[0])
+        return 0
+
+    @traced("reread_squares")
+    def reread_squares(self, cells):
+        """ Reads the given squares (list of (row, col) tuples) again,
+            using stronger preprocessing than the first pass. Returns a
+            dictionary with the alternative readings per square, as a list
+            of (value, confidence) tuples. """
+        readings = {}
+        for row, col in cells:
+            borders = self.square_borders[row * 9 + col]
+            roi = self.square_roi(self.warp, borders)
+            readings[(row, col)] = [self.read_square(filtered)
+                                    for filtered in self.strong_filters(roi)]
+            if self.config.enable_ocr_debug:
+                print("DEBUG OCR -- square %d, %d read again as: %s"
+                      % (row, col, readings[(row, col)]))
+        return readings
+
+    def strong_filters(self, image):
+        """ Returns alternative filtered versions of a square for a
+            second OCR attempt: the first pass filters without denoising,
+            the filters applied to an upscaled version of the square, and
+            a global (Otsu) threshold instead of an adaptive threshold. """
+        upscaled = cv2.resize(image, None, fx=2, fy=2,
+                              interpolation=cv2.INTER_CUBIC)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        _, otsu = cv2.threshold(gray, 0, 255,
+                                cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return [self.apply_filters(image, denoise=False),
+                self.apply_filters(upscaled, denoise=True),
+                otsu]
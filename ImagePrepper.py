@@ -1,6 +1,10 @@
-import cv2
-from decorators import check_debug
-from settings import MAX_HEIGHT_ALLOWED, MAX_WIDTH_ALLOWED, ENABLE_DEBUG
+from decorators import traced
+from lazy_imports import lazy_import
+from errors import ImageLoadError
+from settings import load_config
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
 
 
 class ImagePrepper(object):
@@ -11,34 +15,50 @@ class ImagePrepper(object):
         It also validates input, such as pixel density and
         check if it can handle the given file extension. (jpg, png etc.) '''
 
-    @check_debug
-    def __init__(self, img_link):
-        self.image = cv2.imread(img_link)
+    @traced("prepare")
+    def __init__(self, img_link=None, img_bytes=None, config=None):
+        # The settings to use, defaults to the settings in settings.py
+        self.config = config or load_config()
+        self.image = self.load(img_link, img_bytes)
+        if self.image is None:
+            raise ImageLoadError("Failed to load image. Does the image"
+                                 " exist? Do you have a typo? Note: only"
+                                 " .png, .jpg and .jpeg files are supported.")
         self.height, self.width, self.channels = self.image.shape
         if self.needs_resize():
             self.resize()
 
-    @check_debug
+    @traced("decode")
+    def load(self, img_link=None, img_bytes=None):
+        ''' Read and decode the image file, or decode the given
+            encoded image bytes (contents of a jpg, png etc.) when
+            no file is given. '''
+        if img_link is not None:
+            return cv2.imread(img_link)
+        buffer = np.frombuffer(img_bytes, dtype=np.uint8)
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    @traced("needs_resize")
     def needs_resize(self):
         ''' Determine if the given image requires a resize. '''
-        if (self.height > MAX_HEIGHT_ALLOWED or
-                self.width > MAX_WIDTH_ALLOWED):
-            if ENABLE_DEBUG:
+        if (self.height > self.config.max_height_allowed or
+                self.width > self.config.max_width_allowed):
+            if self.config.enable_debug:
                 print("DEBUG -- Image needs a resize.")
             return True
         return False
 
-    @check_debug
+    @traced("resize")
     def resize(self):
         ''' Resize the image to conform to MAX static ruleset '''
         # Requires that the given image does not exceed the max contraints
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Attempting image resize")
         if self.height > self.width:
             # Determine new image dimensions:
             # The amount to remove from the height of the image to conform
             # to constraints.
-            height_shrinkable = self.height - MAX_HEIGHT_ALLOWED
+            height_shrinkable = self.height - self.config.max_height_allowed
             # The percentage at which the image is shrunk
             height_shrink_percent = (float(height_shrinkable) /
                                      self.height * 100)
@@ -50,7 +70,7 @@ class ImagePrepper(object):
         elif self.width > self.height:
             # Determine new image dimensions
             # Amount to be removed from width to conform to constraint
-            width_shrinkable = self.width - MAX_WIDTH_ALLOWED
+            width_shrinkable = self.width - self.config.max_width_allowed
             # Percentage at which image is shrunk
             width_shrink_percent = float(width_shrinkable) / self.width * 100
             # The new image width and height
@@ -60,13 +80,13 @@ class ImagePrepper(object):
             new_height = int(new_height)
         else:
             # Otherwise, image is a square
-            new_height = MAX_HEIGHT_ALLOWED
-            new_width = MAX_WIDTH_ALLOWED
+            new_height = self.config.max_height_allowed
+            new_width = self.config.max_width_allowed
 
         # Perform the resize operation with calculated values
         self.image = cv2.resize(
             self.image,
             (new_width, new_height),
             interpolation=cv2.INTER_AREA)
-        if ENABLE_DEBUG:
+        if self.config.enable_debug:
             print("DEBUG -- Image succesfully resized.")
@@ -0,0 +1,116 @@
+from errors import ImageProcessingError
+
+from decorators import traced
+from helper_functions import image_preview
+from lazy_imports import lazy_import
+
+# Heavy dependencies are only imported when the image is processed
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+DEV_EMAIL = "st.boonstra@st.hanze.nl"
+
+
+class ImageProcessor(object):
+    """ Base class of ImageExtractor and PageExtractor, holding the
+    operations both of them perform on a photo: converting it to a
+    black/white image in which grids can be found, and ordering the corners
+    of a found grid. Subclasses set self.config to the settings to use. """
+
+    @traced("grayscale")
+    def to_grayscale(self, image):
+        """ Transform the given image to grayscale """
+        if self.config.enable_debug:
+            print("DEBUG -- Attempting to transform image to grayscale.")
+        try:
+            grayscale = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        except Exception:
+            raise ImageProcessingError("Could not convert image to"
+                                       " grayscale.")
+        if self.config.enable_preview_all:
+            image_preview(grayscale)
+        if self.config.enable_debug:
+            print("DEBUG -- Image succesfully converted to grayscale.")
+        return grayscale
+
+    @traced("blur")
+    def apply_blur(self, image):
+        """ Adds a blur to the given image, using the kernel size
+            defined in settings. """
+        if self.config.enable_debug:
+            print("DEBUG -- Attempting to apply gaussian blur to"
+                  " grayscale image.")
+        try:
+            blurred = cv2.GaussianBlur(src=image,
+                                       ksize=self.config.blur_kernel_size,
+                                       sigmaX=0)
+        except Exception:
+            raise ImageProcessingError("Could not apply blur filter. Please"
+                                       " check settings and consider"
+                                       " changing the blur kernel size.")
+        if self.config.enable_preview_all:
+            image_preview(blurred)
+        if self.config.enable_debug:
+            print("DEBUG -- Gaussian Blur succesfully applied.")
+        return blurred
+
+    @traced("threshold")
+    def to_binary(self, image):
+        """ This method uses Adaptive Thresholding to convert
+            a blurred grayscale image to binary (only black and white).
+            The binary image is required to extract the full sudoku grid
+            from the image. """
+        if self.config.enable_debug:
+                print("DEBUG -- Attempting to apply adaptive threshold"
+                      " and convert image to black and white.")
+        try:
+            thresh = cv2.adaptiveThreshold(image, 255, 1, 1, 11, 2)
+        except Exception:
+            raise ImageProcessingError(
+                "Unable to convert the image to black/white. Please contact"
+                " the developer at %s and include this error and the image"
+                " you are using." % DEV_EMAIL)
+        if self.config.enable_preview or self.config.enable_preview_all:
+            image_preview(thresh)
+        if self.config.enable_debug:
+            print("DEBUG -- Image succesfully converted to binary.")
+        return thresh
+
+    def order_corners(self, contour):
+        """ Returns the 4 corners of the given contour as float32 array,
+            in clock-wise order starting at the top-left corner. """
+        # The corners of the contour (including the curve approximation)
+        # need to be put in clock-wise order (top-left -> top-right
+        # bottom-right -> bottom-left). This is not yet the case so
+        # new corners must be calculated.
+
+        # Reshape the array to look as follows:
+        # array([[0, 0],
+        #        [0, 0],
+        #        [0, 0],
+        #        [0, 0]])
+        points = contour.reshape(4, 2)
+        # Initialize an empty array with zeros,
+        # so that the corner points can be stored later
+        rectangle_corners = np.zeros(
+            (4, 2),
+            dtype="float32")
+
+        points_sum = points.sum(axis=1)
+        # If we look at the SUM of all corners (x, y) pairs, assuming the full
+        # image starts at position 0, 0 at the top-left, we can sum all the
+        # coordinate pairs. Afterward, the most top-left corner will have the
+        # LOWEST sum (closest to 0, 0) and the bottom-right corner will have
+        # the HIGHEST sum (farthest from 0, 0). With this knowledge, we can
+        # already place the x, y coordinates for the top-left and bottom-right
+        # corner in the corner array
+        rectangle_corners[0] = points[np.argmin(points_sum)]
+        rectangle_corners[2] = points[np.argmax(points_sum)]
+
+        # We can sortof do the same for the remaining two corners (top-right
+        # and bottom-left) but by using the DIFFERENCE between (x,y) coordinate
+        # pairs
+        points_difference = np.diff(points, axis=1)
+        rectangle_corners[1] = points[np.argmin(points_difference)]
+        rectangle_corners[3] = points[np.argmax(points_difference)]
+        return rectangle_corners
@@ -0,0 +1,197 @@
+from settings import load_config
+from errors import GridNotFoundError, SudokuError
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from decorators import traced
+from helper_functions import image_preview
+from lazy_imports import lazy_import
+from ImageProcessor import ImageProcessor
+from ImageExtractor import ImageExtractor
+from BoardRepairer import BoardRepairer
+from SudokuSolver import solve_sudoku
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+def solve_start_grid(start_grid):
+    """ Solves the given board. Returns the solution, or None if the
+        board is not valid or has no solution. Runs in a worker process. """
+    try:
+        return solve_sudoku(start_grid).board
+    except SudokuError:
+        return None
+
+
+class PageExtractor(ImageProcessor):
+    """ Extracts every sudoku on a page, such as a newspaper page or a page
+        of a puzzle book, instead of only the biggest one.
+
+        The page is converted to a black/white image once. Every closed
+        shape with 4 corners that is big enough, about square, and shows
+        the lines of a sudoku grid when warped is considered a grid. The
+        grids are then warped and read (OCR) concurrently in threads, and
+        solved concurrently in worker processes.
+
+        Usage:
+            page = PageExtractor(image)
+            for grid, solution in page.solve_all():
+                # grid is an ImageExtractor, solution None if unsolved """
+
+    def __init__(self, image, config=None):
+        # The settings to use, defaults to the settings in settings.py
+        self.config = config or load_config()
+        self.original_image = image  # The original image from the user
+        self.grayscale = self.to_grayscale(image)  # Grayscale version of image
+        # Apply gaussian blur to grayscale image
+        self.blurred = self.apply_blur(self.grayscale)
+        self.thresh = self.to_binary(self.blurred)
+        self.grid_contours = self.find_grids(self.thresh)
+        self.grids = self.extract_grids(self.grid_contours)
+
+    @traced("find_grids")
+    def find_grids(self, image):
+        """ Returns the contours of all sudoku grids in the black/white
+            image, in reading order (top to bottom, left to right).
+            Raises a GridNotFoundError if there are none. """
+        if self.config.enable_debug:
+            print("DEBUG -- Attempting to find all sudoku grids"
+                  " in the image.")
+        contours, hierarchy = cv2.findContours(
+                                image=image,
+                                mode=cv2.RETR_LIST,
+                                method=cv2.CHAIN_APPROX_SIMPLE)
+        height, width = image.shape[:2]
+        min_viable_area = self.config.min_grid_area_ratio * height * width
+
+        # Every big enough, roughly square shape with 4 corners
+        candidates = []
+        for cnt in contours:
+            cur_area = cv2.contourArea(cnt)
+            if cur_area < min_viable_area:
+                continue
+            approx = cv2.approxPolyDP(
+                curve=cnt,
+                epsilon=0.02 * cv2.arcLength(cnt, True),
+                closed=True)
+            if (len(approx) == 4 and cv2.isContourConvex(approx) and
+                    self.is_square(approx)):
+                candidates.append((cur_area, approx))
+
+        # Biggest first, so the 3x3 boxes (and the inner border of thick
+        # grid lines) within an accepted grid can be skipped.
+        candidates.sort(key=lambda candidate: -candidate[0])
+        grids = []
+        for cur_area, approx in candidates:
+            center = tuple(float(c)
+                           for c in approx.reshape(4, 2).mean(axis=0))
+            if any(cv2.pointPolygonTest(grid, center, False) >= 0
+                   for grid in grids):
+                continue
+            if self.has_grid_lines(image, approx):
+                grids.append(approx)
+
+        if not grids:
+            raise GridNotFoundError("Could not find a sudoku grid in the"
+                                    " image.")
+
+        # Reading order. Grids which tops are less than half the height of
+        # the smallest grid apart are considered to be on the same row.
+        row_height = min(cv2.boundingRect(g)[3] for g in grids) / 2.0
+        grids.sort(key=lambda g: (int(cv2.boundingRect(g)[1] // row_height),
+                                  cv2.boundingRect(g)[0]))
+
+        if self.config.enable_preview or self.config.enable_preview_all:
+            _ = self.original_image.copy()
+            cv2.drawContours(image=_, contours=grids, contourIdx=-1,
+                             color=(255, 0, 0))
+            image_preview(_)
+        if self.config.enable_debug:
+            print("DEBUG -- Found %d sudoku grids in the image."
+                  % len(grids))
+        return grids
+
+    def is_square(self, contour):
+        """ Determines if the shape with 4 corners is about as wide as it
+            is high, allowing for MAX_GRID_ASPECT_DEVIATION. """
+        top_left, top_right, bot_right, bot_left = self.order_corners(contour)
+        width = (np.linalg.norm(top_right - top_left) +
+                 np.linalg.norm(bot_right - bot_left)) / 2
+        height = (np.linalg.norm(bot_left - top_left) +
+                  np.linalg.norm(bot_right - top_right)) / 2
+        if not width or not height:
+            return False
+        deviation = abs(width / height - 1)
+        return deviation <= self.config.max_grid_aspect_deviation
+
+    def has_grid_lines(self, image, contour):
+        """ Determines if the shape looks like a sudoku grid on the inside.
+            The shape is warped to a square, after which the black/white
+            image should show a line at each of the 10 horizontal and 10
+            vertical positions where a sudoku has grid lines. At least
+            MIN_GRID_LINES lines are required in both directions. """
+        size = 450
+        destination = np.array([[0, 0], [size, 0], [size, size], [0, size]],
+                               dtype="float32")
+        matrix = cv2.getPerspectiveTransform(self.order_corners(contour),
+                                             destination)
+        warp = cv2.warpPerspective(image, matrix, (size, size),
+                                   flags=cv2.INTER_NEAREST) > 0
+        # Lines may be a few pixels off due to lens distortion or paper
+        # that is not entirely flat
+        band = 6
+        horizontal = vertical = 0
+        for i in range(10):
+            position = min(i * size // 9, size - 1)
+            start, end = max(position - band, 0), min(position + band + 1,
+                                                      size)
+            # Line coverage: the fraction of a row/column that is white
+            if warp[start:end, :].mean(axis=1).max() > 0.5:
+                horizontal += 1
+            if warp[:, start:end].mean(axis=0).max() > 0.5:
+                vertical += 1
+        min_lines = self.config.min_grid_lines
+        return horizontal >= min_lines and vertical >= min_lines
+
+    def extract_grid_values(self, contour):
+        """ Warps and reads a single grid. Repairs the values that were
+            read if board repair is enabled in the settings. """
+        grid = ImageExtractor(self.original_image, grid_contour=contour,
+                              config=self.config)
+        if self.config.enable_board_repair:
+            grid.starting_grid = (BoardRepairer(grid).repair() or
+                                  grid.starting_grid)
+        return grid
+
+    @traced("extract_grids")
+    def extract_grids(self, contours):
+        """ Warps and reads all grids. The OCR engine runs as a separate
+            process, so the grids are read concurrently in threads. When
+            previews are enabled, grids are read one by one instead. """
+        previews = (self.config.enable_preview or
+                    self.config.enable_preview_all)
+        if previews or len(contours) < 2:
+            return [self.extract_grid_values(c) for c in contours]
+        pool = ThreadPool(min(self.config.page_workers, len(contours)))
+        try:
+            return pool.map(self.extract_grid_values, contours)
+        finally:
+            pool.close()
+            pool.join()
+
+    @traced("solve_all")
+    def solve_all(self):
+        """ Solves all grids concurrently in worker processes. Returns a
+            list of (grid, solution) tuples in reading order, in which
+            solution is None if the grid could not be solved. """
+        boards = [grid.starting_grid for grid in self.grids]
+        if len(boards) < 2:
+            solutions = [solve_start_grid(board) for board in boards]
+        else:
+            pool = Pool(min(self.config.page_workers, len(boards)))
+            try:
+                solutions = pool.map(solve_start_grid, boards)
+            finally:
+                pool.close()
+                pool.join()
+        return list(zip(self.grids, solutions))
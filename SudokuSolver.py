@@ -1,5 +1,11 @@
 from copy import deepcopy
-from settings import ENABLE_DEBUG
+from errors import InvalidBoardError, UnsolvableError
+
+
+# Bitmask of the values [1,9], bit n represents value n
+ALL_VALUES = 0b1111111110
+# The amount of values in every bitmask of values
+BIT_COUNTS = [bin(mask).count('1') for mask in range(ALL_VALUES + 1)]
 
 
 class SudokuSolver(object):
@@ -12,12 +18,18 @@ class SudokuSolver(object):
         Exposed methods:
             solve          -- Attempts to solve the sudoku
             board_is_valid -- Check wheter the board with which the
-                              object is instantiated is a valid board. """
+                              object is instantiated is a valid board.
+            conflicting_cells -- The squares of the board that break
+                                 the rules of sudoku
+            count_solutions   -- Count the solutions of a board
+            find_solutions    -- Find the solutions of a board """
 
-    def __init__(self, start_board):
+    def __init__(self, start_board, debug=False):
         ''' Initializer for the SodukoSolver object.
             Requires a sudoku board as argument.
-            Assumes the given board is validated.'''
+            Assumes the given board is validated.
+            Prints debug messages when debug is True.'''
+        self.debug = debug
         self.is_solved = False
         self.board = deepcopy(start_board)
 
@@ -75,7 +87,7 @@ class SudokuSolver(object):
                 - The positions value is unique in its 3x3 box
             A board is considered valid if all of it's inputted
             values comply with the above three rules. '''
-        if ENABLE_DEBUG:
+        if self.debug:
             print("GLOBAL DEBUG -- Checking to see if starting board is"
                   " valid.")
         board = self.board
@@ -96,6 +108,132 @@ class SudokuSolver(object):
                 board[i][j] = _
         return is_valid
 
+    def conflicting_cells(self):
+        ''' Returns the positions (row, col) of all values on the board
+            that break the rules checked by board_is_valid, so every value
+            that is not unique in its row, column or box, or is not in the
+            range [1,9]. An empty list means the board is valid. '''
+        board = self.board
+        conflicts = []
+        for i, row in enumerate(board):
+            for j, val in enumerate(row):
+                if val == 0:
+                    continue
+                # Temporarily unset the position, like board_is_valid
+                board[i][j] = 0
+                if not self.is_legal_move(board, i, j, val):
+                    conflicts.append((i, j))
+                board[i][j] = val
+        return conflicts
+
+    def count_solutions(self, board, limit=2):
+        ''' Counts the solutions of the given board, see find_solutions.
+            Counting stops as soon as the limit is reached, so with the
+            default limit the result tells whether a board has no, exactly
+            one, or multiple solutions. '''
+        return len(self.find_solutions(board, limit))
+
+    def find_solutions(self, board, limit=1):
+        ''' Returns the solutions of the given board, as a list of at
+            most limit completed boards. Values already on the board are
+            not checked, see conflicting_cells. The board is left
+            unchanged.
+            Unlike solve, this does not try the empty squares in order.
+            The values used in every row, column and box (a unit) are kept
+            as bitmasks, and every step fills in the most constrained
+            option: the square with the fewest candidates, or the value
+            that fits the fewest squares of a unit. A unit in which a
+            missing value fits nowhere ends the step right away. That way
+            solutions are found in milliseconds, even for sudokus that take
+            solve minutes. '''
+        # Bit n is set if value n is used in the unit. Units 0-8 are the
+        # rows, 9-17 the columns and 18-26 the boxes.
+        used = [0] * 27
+        empty = []  # The units of every empty square
+        for i, row in enumerate(board):
+            for j, val in enumerate(row):
+                units = (i, 9 + j, 18 + (i // 3) * 3 + j // 3)
+                if val == 0:
+                    empty.append(units)
+                else:
+                    for unit in units:
+                        used[unit] |= 1 << val
+
+        filled = []  # The (row, col, value) filled in so far
+        solutions = []
+
+        def count(empty, limit):
+            if not empty:
+                solution = [list(row) for row in board]
+                for i, j, val in filled:
+                    solution[i][j] = val
+                solutions.append(solution)
+                return 1
+            options = [ALL_VALUES & ~(used[row] | used[col] | used[box])
+                       for row, col, box in empty]
+            best = min(range(len(empty)),
+                       key=lambda index: BIT_COUNTS[options[index]])
+            fewest = BIT_COUNTS[options[best]]
+            if fewest == 0:
+                return 0
+
+            # Values that fit one (once), two (twice) or more squares
+            once, twice, more = [0] * 27, [0] * 27, [0] * 27
+            for units, square_options in zip(empty, options):
+                for unit in units:
+                    more[unit] |= twice[unit] & square_options
+                    twice[unit] |= once[unit] & square_options
+                    once[unit] |= square_options
+            unit_value = None
+            for unit in range(27):
+                if once[unit] != ALL_VALUES & ~used[unit]:
+                    return 0
+                if fewest > 1 and once[unit] & ~twice[unit]:
+                    fewest = 1
+                    unit_value = (unit, once[unit] & ~twice[unit])
+                elif fewest > 2 and twice[unit] & ~more[unit]:
+                    fewest = 2
+                    unit_value = (unit, twice[unit] & ~more[unit])
+            if fewest > 2:
+                # Mostly on nearly empty boards, count the squares of
+                # every missing value of every unit
+                for unit in range(27):
+                    unit_options = [options[index]
+                                    for index, units in enumerate(empty)
+                                    if unit in units]
+                    for val in range(1, 10):
+                        if once[unit] & (1 << val):
+                            places = sum(1 for square_options in unit_options
+                                         if square_options & (1 << val))
+                            if places < fewest:
+                                fewest, unit_value = places, (unit, 1 << val)
+
+            # The (square, value) options to try
+            if unit_value is None:
+                moves = [(best, 1 << val) for val in range(1, 10)
+                         if options[best] & (1 << val)]
+            else:
+                unit, values = unit_value
+                bit = values & -values  # Lowest value only
+                moves = [(index, bit) for index, units in enumerate(empty)
+                         if unit in units and options[index] & bit]
+            found = 0
+            for index, bit in moves:
+                units = empty[index]
+                for unit in units:
+                    used[unit] |= bit
+                filled.append((units[0], units[1] - 9, bit.bit_length() - 1))
+                found += count(empty[:index] + empty[index + 1:],
+                               limit - found)
+                filled.pop()
+                for unit in units:
+                    used[unit] ^= bit
+                if found >= limit:
+                    break
+            return found
+        count(empty, limit)
+        return solutions
+
     def exists_in_column(self, board, col, val):
         ''' Determine if a given value exists in the
             given column. '''
@@ -238,3 +376,41 @@ class SudokuGrid(object):
             print(cur_line)
             if (i+1) % 3 == 0:
                 print(hor_line)
+
+
+def parse_grid(text):
+    ''' Parses a textual representation of a sudoku into a 9x9 list.
+        The text must contain exactly 81 values, read row by row.
+        Digits 1-9 are given values; 0 and . represent empty squares.
+        Any other character (whitespace, separators) is ignored.
+        Raises a ValueError if the text does not contain 81 values. '''
+    values = [0 if char == '.' else int(char)
+              for char in text if char == '.' or char.isdigit()]
+    if len(values) != 81:
+        raise ValueError("Expected 81 values in sudoku text, found %d."
+                         % len(values))
+    return [values[row * 9:row * 9 + 9] for row in range(9)]
+
+
+def grid_to_text(board):
+    ''' Returns the given 9x9 list as a single line of 81 digits,
+        the inverse of parse_grid. '''
+    return ''.join(str(val) for row in board for val in row)
+
+
+def solve_sudoku(start_board, debug=False):
+    ''' Validates and solves the given board, using the search of
+        find_solutions rather than the brute-force solve method. Returns
+        the SudokuSolver, holding the solution in its board attribute.
+        Raises an InvalidBoardError if the starting values break the rules
+        of sudoku, or an UnsolvableError if there is no solution. '''
+    solver = SudokuSolver(start_board, debug=debug)
+    if not solver.board_is_valid():
+        raise InvalidBoardError("Starting values found in sudoku were not"
+                                " valid.")
+    solutions = solver.find_solutions(solver.board)
+    if not solutions:
+        raise UnsolvableError("Sudoku could not be solved.")
+    solver.board = solutions[0]
+    solver.is_solved = True
+    return solver
@@ -0,0 +1,353 @@
+"""
+End-to-end benchmark of the image pipeline, using synthetic sudoku photos.
+
+Test images are generated locally: a random sudoku is rendered with one of
+several fonts, warped with a random perspective onto a cluttered background
+and made worse by a lighting gradient, blur and noise. The starting values
+are saved next to each image as ground truth.
+
+Running the benchmark processes every image with ImagePrepper and
+ImageExtractor, with tracing enabled (see tracing.py), and reports:
+    - latency per pipeline stage (mean, median, 95th percentile)
+    - the OCR backend latency per square
+    - images per second and peak memory use
+    - digit accuracy: how many squares were read correctly
+
+That way, changes that speed up the pipeline can be checked for accuracy
+regressions on exactly the same images.
+
+Usage:
+    $ python benchmark.py generate bench_images --count 20 --seed 1
+    $ python benchmark.py run bench_images --json bench_output.json
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+import settings
+
+# Tracing (and debug output of the traced decorator) is set up when the
+# pipeline modules are imported, so it has to be configured first.
+settings.ENABLE_TRACING = True
+settings.ENABLE_DEBUG = False
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+import tracing  # noqa: E402
+from errors import SudokuError  # noqa: E402
+from SudokuSolver import SudokuSolver  # noqa: E402
+from ImagePrepper import ImagePrepper  # noqa: E402
+from ImageExtractor import ImageExtractor  # noqa: E402
+from BoardRepairer import BoardRepairer  # noqa: E402
+
+# The pipeline settings used for the benchmark
+CONFIG = settings.load_config(enable_preview=False,
+                              enable_preview_all=False,
+                              enable_debug=False,
+                              enable_ocr_debug=False)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Fonts the digits are rendered with. Paths to TrueType fonts can be added
+# with the --font option of the generate command.
+HERSHEY_FONTS = [cv2.FONT_HERSHEY_SIMPLEX,
+                 cv2.FONT_HERSHEY_DUPLEX,
+                 cv2.FONT_HERSHEY_COMPLEX,
+                 cv2.FONT_HERSHEY_TRIPLEX,
+                 cv2.FONT_HERSHEY_SIMPLEX | cv2.FONT_ITALIC]
+
+
+def random_puzzle(rng, givens):
+    """ Returns a random sudoku with the given amount of starting values,
+        or as close to it as possible while the sudoku keeps exactly one
+        solution. A valid solution is created by shuffling the rows,
+        columns and digits of a base pattern, after which squares are
+        emptied in random order, skipping squares that are needed to keep
+        the solution unique. """
+    def shuffled_groups():
+        groups = rng.sample(range(3), 3)
+        return [g * 3 + i for g in groups for i in rng.sample(range(3), 3)]
+    rows, cols = shuffled_groups(), shuffled_groups()
+    digits = rng.sample(range(1, 10), 9)
+    board = [[digits[(3 * (r % 3) + r // 3 + c) % 9] for c in cols]
+             for r in rows]
+    solver = SudokuSolver(board)
+    remaining = 81
+    for position in rng.sample(range(81), 81):
+        if remaining == givens:
+            break
+        row, col = position // 9, position % 9
+        value, board[row][col] = board[row][col], 0
+        if solver.count_solutions(board) == 1:
+            remaining -= 1
+        else:
+            board[row][col] = value
+    return board
+
+
+def draw_digit(grid_image, digit, box, font):
+    """ Draws a digit centered in the box (x, y, size) of the grid image,
+        using a Hershey font or the path of a TrueType font. """
+    x, y, size = box
+    text = str(digit)
+    if isinstance(font, int):
+        scale = size / 40.0
+        (width, height), _ = cv2.getTextSize(text, font, scale, 2)
+        org = (x + (size - width) // 2, y + (size + height) // 2)
+        cv2.putText(grid_image, text, org, font, scale, 0, 2, cv2.LINE_AA)
+        return
+    from PIL import Image, ImageDraw, ImageFont
+    pil_font = ImageFont.truetype(font, int(size * 0.7))
+    glyph = Image.new('L', (size, size), 255)
+    draw = ImageDraw.Draw(glyph)
+    if hasattr(draw, 'textbbox'):
+        left, top, right, bottom = draw.textbbox((0, 0), text,
+                                                 font=pil_font)
+    else:  # Pillow before 8.0, the last versions for Python 2.7
+        left, top = pil_font.getoffset(text)
+        right, bottom = draw.textsize(text, font=pil_font)
+    draw.text(((size - (right - left)) // 2 - left,
+               (size - (bottom - top)) // 2 - top),
+              text, fill=0, font=pil_font)
+    region = grid_image[y:y + size, x:x + size]
+    np.minimum(region, np.array(glyph), out=region)
+
+
+def render_grid(board, font, size=450):
+    """ Renders the board as a black on white sudoku grid, with thick
+        lines around the 3x3 boxes. """
+    grid_image = np.full((size, size), 255, dtype=np.uint8)
+    square = size // 9
+    for row in range(9):
+        for col in range(9):
+            if board[row][col]:
+                draw_digit(grid_image, board[row][col],
+                           (col * square, row * square, square), font)
+    for i in range(10):
+        position = min(i * square, size - 1)
+        thickness = 4 if i % 3 == 0 else 1
+        cv2.line(grid_image, (position, 0), (position, size), 0, thickness)
+        cv2.line(grid_image, (0, position), (size, position), 0, thickness)
+    return grid_image
+
+
+def cluttered_background(rng, width, height):
+    """ Returns a gray background with random lines, shapes and text,
+        like a table or a newspaper around the sudoku. """
+    background = np.full((height, width), rng.randint(90, 200),
+                         dtype=np.uint8)
+    for _ in range(rng.randint(5, 25)):
+        color = rng.randint(0, 255)
+        p1 = (rng.randint(0, width), rng.randint(0, height))
+        p2 = (rng.randint(0, width), rng.randint(0, height))
+        shape = rng.choice(['line', 'rectangle', 'text'])
+        if shape == 'line':
+            cv2.line(background, p1, p2, color, rng.randint(1, 4))
+        elif shape == 'rectangle':
+            cv2.rectangle(background, p1, p2, color, rng.randint(-1, 3))
+        else:
+            cv2.putText(background, 'Puzzle %d' % rng.randint(1, 99), p1,
+                        cv2.FONT_HERSHEY_SIMPLEX, rng.uniform(0.5, 2),
+                        color, 2)
+    return background
+
+
+def synthesize_photo(board, font, rng, width=900, height=900):
+    """ Returns a synthetic photo (BGR) of the board: the rendered grid
+        is placed with a random perspective onto a cluttered background,
+        after which a lighting gradient, blur and noise are applied. """
+    grid_image = render_grid(board, font)
+    size = grid_image.shape[0]
+    photo = cluttered_background(rng, width, height)
+
+    # Random placement and perspective of the paper with the grid on it
+    margin = 0.1 * min(width, height)
+    grid_size = rng.uniform(0.55, 0.75) * min(width, height)
+    left = rng.uniform(margin, width - margin - grid_size)
+    top = rng.uniform(margin, height - margin - grid_size)
+    skew = 0.08 * grid_size
+    corners = np.array([[left, top],
+                        [left + grid_size, top],
+                        [left + grid_size, top + grid_size],
+                        [left, top + grid_size]], dtype="float32")
+    corners += np.array([[rng.uniform(-skew, skew), rng.uniform(-skew, skew)]
+                         for _ in range(4)], dtype="float32")
+    source = np.array([[0, 0], [size, 0], [size, size], [0, size]],
+                      dtype="float32")
+    matrix = cv2.getPerspectiveTransform(source, corners)
+    # A white border around the grid, like the paper it is printed on
+    paper = cv2.copyMakeBorder(grid_image, 20, 20, 20, 20,
+                               cv2.BORDER_CONSTANT, value=255)
+    shift = np.array([[1, 0, -20], [0, 1, -20], [0, 0, 1]], dtype="float64")
+    matrix = np.dot(matrix, shift)
+    warped = cv2.warpPerspective(paper, matrix, (width, height))
+    mask = cv2.warpPerspective(np.full(paper.shape, 255, dtype=np.uint8),
+                               matrix, (width, height))
+    photo[mask > 127] = warped[mask > 127]
+
+    # Lighting gradient in a random direction
+    angle = rng.uniform(0, 2 * np.pi)
+    ys, xs = np.mgrid[0:height, 0:width].astype("float32")
+    gradient = np.cos(angle) * xs / width + np.sin(angle) * ys / height
+    gradient = (gradient - gradient.min()) / (np.ptp(gradient) or 1)
+    darkest = rng.uniform(0.5, 0.9)
+    photo = photo * (darkest + (1 - darkest) * gradient)
+
+    kernel = rng.choice([1, 3, 5])
+    photo = cv2.GaussianBlur(photo, (kernel, kernel), 0)
+    photo = photo + np.random.RandomState(rng.randint(0, 2 ** 31)).normal(
+        0, rng.uniform(0, 12), photo.shape)
+    photo = np.clip(photo, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR)
+
+
+def generate(directory, count, seed, fonts):
+    """ Writes count synthetic photos to the directory, each with a json
+        file holding the starting values (ground truth). """
+    rng = random.Random(seed)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for i in range(count):
+        board = random_puzzle(rng, givens=rng.randint(22, 36))
+        font = fonts[i % len(fonts)]
+        photo = synthesize_photo(board, font, rng)
+        name = os.path.join(directory, 'sudoku_%03d' % i)
+        cv2.imwrite(name + '.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        with open(name + '.json', 'w') as truth_file:
+            json.dump({'board': board, 'font': str(font)}, truth_file)
+    print("Generated %d images in %s." % (count, directory))
+
+
+def peak_memory_mb():
+    """ Returns the peak resident memory of this process in MB, or None
+        if it can not be determined on this platform. """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def run(directory, repair=False):
+    """ Processes every image in the directory and returns the report. """
+    paths = sorted(glob.glob(os.path.join(directory, '*.jpg')))
+    if not paths:
+        raise ValueError("No .jpg images found in %s." % directory)
+    durations = {}  # Stage name -> list of durations in seconds
+    squares = correct = digits = digits_correct = failures = 0
+    errors = {}  # Exception name -> amount of images
+    start = time.time()
+    for path in paths:
+        with open(os.path.splitext(path)[0] + '.json') as truth_file:
+            truth = json.load(truth_file)['board']
+        tracing.reset()
+        try:
+            image_container = ImagePrepper(path, config=CONFIG)
+            extracted_info = ImageExtractor(image_container.image,
+                                            config=CONFIG)
+            board = extracted_info.starting_grid
+            if repair:
+                board = BoardRepairer(extracted_info).repair() or board
+        except SudokuError as e:
+            # No grid found or a stage failed: every square counts as wrong
+            failures += 1
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            board = [[None] * 9 for _ in range(9)]
+        for span in tracing.spans():
+            durations.setdefault(span['name'], []).append(span['duration'])
+        for truth_row, row in zip(truth, board):
+            for expected, found in zip(truth_row, row):
+                squares += 1
+                correct += expected == found
+                if expected:
+                    digits += 1
+                    digits_correct += expected == found
+    elapsed = time.time() - start
+
+    stages = {}
+    for name, values in durations.items():
+        stages[name] = {'count': len(values),
+                        'total_ms': sum(values) * 1000.0,
+                        'mean_ms': sum(values) / len(values) * 1000.0,
+                        'median_ms': percentile(values, 0.5) * 1000.0,
+                        'p95_ms': percentile(values, 0.95) * 1000.0}
+    return {'images': len(paths),
+            'failures': failures,
+            'errors': errors,
+            'seconds': elapsed,
+            'images_per_second': len(paths) / elapsed,
+            'peak_memory_mb': peak_memory_mb(),
+            'square_accuracy': float(correct) / squares,
+            'digit_accuracy': float(digits_correct) / (digits or 1),
+            'stages': stages}
+
+
+def print_report(report):
+    print("%-16s %6s %10s %10s %10s %10s" % ('stage', 'count', 'total ms',
+                                             'mean ms', 'median ms',
+                                             'p95 ms'))
+    stages = report['stages']
+    for name in sorted(stages, key=lambda n: -stages[n]['total_ms']):
+        stage = stages[name]
+        print("%-16s %6d %10.1f %10.2f %10.2f %10.2f"
+              % (name, stage['count'], stage['total_ms'], stage['mean_ms'],
+                 stage['median_ms'], stage['p95_ms']))
+    print("")
+    print("Images:           %d (%d failed)" % (report['images'],
+                                                report['failures']))
+    for name in sorted(report['errors']):
+        print("  %-15s %d" % (name + ':', report['errors'][name]))
+    print("Images/second:    %.2f" % report['images_per_second'])
+    if report['peak_memory_mb'] is not None:
+        print("Peak memory:      %.1f MB" % report['peak_memory_mb'])
+    print("Square accuracy:  %.1f%%" % (report['square_accuracy'] * 100))
+    print("Digit accuracy:   %.1f%%" % (report['digit_accuracy'] * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the image pipeline on synthetic photos.")
+    commands = parser.add_subparsers(dest='command')
+    generate_parser = commands.add_parser(
+        'generate', help="Generate synthetic photos with ground truth")
+    generate_parser.add_argument('directory')
+    generate_parser.add_argument('--count', type=int, default=20)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--font', action='append', default=[],
+                                 help="Path of an extra TrueType font")
+    run_parser = commands.add_parser(
+        'run', help="Run the pipeline on generated photos")
+    run_parser.add_argument('directory')
+    run_parser.add_argument('--repair', action='store_true',
+                            help="Include board repair (BoardRepairer)")
+    run_parser.add_argument('--json', help="Also write the report here")
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        generate(args.directory, args.count, args.seed,
+                 HERSHEY_FONTS + args.font)
+    elif args.command == 'run':
+        report = run(args.directory, repair=args.repair)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as report_file:
+                json.dump(report, report_file, indent=1)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
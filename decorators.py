@@ -16,17 +16,47 @@ What basically happens is this:
 By using decorators, a wrapper can be added to EVERY method.
 This is used to print the method name whenerver it is entered, without having
 to use print statements in the methods themselves. This cleans up the code
-by quite a lot.
+by quite a lot. The same wrapper records a tracing span (see tracing.py).
+
+Note that the wrapper is only added when debugging or tracing is enabled in
+the settings. Otherwise the decorator returns the method itself, so disabled
+debugging does not cost an extra function call on every invocation.
 """
 import settings
+import tracing
+
 
+def traced(name):
+    """ Use a wrapper around the given function, recording a tracing span
+        with the given stage name and printing the method name when
+        debugging has been enabled in the settings. When neither tracing
+        nor debugging is enabled, the function is returned unwrapped. """
+    def decorator(func):
+        if not (tracing.ENABLED or settings.ENABLE_DEBUG):
+            return func
 
-def check_debug(func):
-    """ Use a wrapper around the given function. The wrapper will cause
-        every method to print its own name when called if debugging
-        has been enabled in the settings. """
-    def print_debug_statement(*args, **kwargs):
-        if settings.ENABLE_DEBUG:
-            print("DEBUG -- Entered method %s" % func.func_name)
-        return func(*args, **kwargs)
-    return print_debug_statement
+        def trace_and_debug(*args, **kwargs):
+            if settings.ENABLE_DEBUG:
+                print("DEBUG -- Entered method %s" % func.__name__)
+            if not tracing.ENABLED:
+                return func(*args, **kwargs)
+            # The size of the first image (or list) that is passed in
+            in_size = None
+            for arg in args:
+                in_size = tracing.size_of(arg)
+                if in_size is not None:
+                    break
+            result = None
+            start = tracing.clock()
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                tracing.record(name, start, tracing.clock(),
+                               method=func.__name__,
+                               in_size=in_size,
+                               out_size=tracing.size_of(result))
+        trace_and_debug.__name__ = func.__name__
+        trace_and_debug.__doc__ = func.__doc__
+        return trace_and_debug
+    return decorator
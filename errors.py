@@ -0,0 +1,28 @@
+""" Exceptions raised by the image pipeline and the solver.
+    All of them derive from SudokuError, so a caller (main.py, the server)
+    can handle every expected failure in one place instead of the pipeline
+    exiting the whole process. """
+
+
+class SudokuError(Exception):
+    """ Base class of all expected failures. """
+
+
+class ImageLoadError(SudokuError):
+    """ The image could not be read or decoded. """
+
+
+class ImageProcessingError(SudokuError):
+    """ A filter or transformation of the image failed. """
+
+
+class GridNotFoundError(SudokuError):
+    """ No sudoku grid was found in the image. """
+
+
+class InvalidBoardError(SudokuError):
+    """ The values read from the image break the rules of sudoku. """
+
+
+class UnsolvableError(SudokuError):
+    """ The sudoku does not have a solution. """
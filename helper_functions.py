@@ -1,7 +1,9 @@
 """ This file contains helper function not attributed to any class
     but still helpful in the main execution of the program. Added to be able
     to adhere to the DRY principle. """
-import cv2
+from lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
 
 
 def image_preview(image):
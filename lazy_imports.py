@@ -0,0 +1,57 @@
+"""
+Lazy loading of heavy third party modules.
+
+OpenCV, numpy, PIL and pytesseract take a long time to import, while
+a lot of executions (solving a textual sudoku, for example) never use them.
+Modules that need them create a placeholder instead of importing them:
+
+    cv2 = lazy_import('cv2')
+
+The real module is imported the first time one of its attributes is
+accessed, for example on the first call to cv2.imread. After that,
+every attribute that was used is stored on the placeholder itself, so
+later accesses are as fast as on the real module.
+"""
+import importlib
+
+# Every placeholder that was created, so they can be loaded up front
+_lazy_modules = []
+
+
+class LazyModule(object):
+    """ Placeholder for a module that is imported on first use. """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        """ Imports the module (if not yet imported) and returns it. """
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        # Only called for attributes not yet stored on the placeholder
+        value = getattr(self.load(), attr)
+        setattr(self, attr, value)
+        return value
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return "<lazy module '%s' (%s)>" % (self._name, state)
+
+
+def lazy_import(name):
+    """ Returns a placeholder for the module with the given (dotted) name,
+        which imports the module when it is used for the first time. """
+    module = LazyModule(name)
+    _lazy_modules.append(module)
+    return module
+
+
+def preload_all():
+    """ Imports every module that was lazily imported so far. Used by
+        long-running processes that rather pay the import cost up front. """
+    for module in _lazy_modules:
+        module.load()
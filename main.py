@@ -1,72 +1,120 @@
+import atexit
 import settings
+import tracing
 # import cv2
-# from decorators import check_debug
+# from decorators import traced
 from ImagePrepper import ImagePrepper
 from ImageExtractor import ImageExtractor
-from SudokuSolver import SudokuSolver
+from PageExtractor import PageExtractor
+from SudokuSolver import SudokuSolver, solve_sudoku
+from BoardRepairer import BoardRepairer
+from errors import SudokuError, InvalidBoardError
 from helper_functions import image_preview, display_solution
+from renderer import render_solution, save_image
 from sys import exit
 
 
 if __name__ == "__main__":
+    # Write trace and profile results, also when the script exits early
+    atexit.register(tracing.finish)
+    tracing.start_profiler()
+
     if settings.ENABLE_DEBUG:
         print("DEBUG GLOBAL -- Main script execution started.")
         print("DEBUG GLOBAL -- Attempting to load image.")
 
+    # The settings passed through the pipeline
+    config = settings.load_config()
+
     # Attempt to load the image
     try:
-        image_container = ImagePrepper(settings.FILE_NAME)
-    except:
+        image_container = ImagePrepper(settings.FILE_NAME, config=config)
+    except SudokuError as e:
         if settings.VERBOSE_EXIT:
-            print("ERROR -- Failed to load image. Does the image "
-                  "exist? Do you have a typo? Note: only .png, .jpg and "
-                  ".jpeg files are supported.")
+            print("ERROR -- %s" % e)
         exit()
-    if settings.ENABLE_DEBUG:
+    if config.enable_debug:
         print("DEBUG GLOBAL -- Image succesfully loaded.")
         print("DEBUG GLOBAL -- Attempting to extract values from image.")
     # Show preview if enabled in the settings
-    if settings.ENABLE_PREVIEW or settings.ENABLE_PREVIEW_ALL:
+    if config.enable_preview or config.enable_preview_all:
         image_preview(image_container.image)
 
-    extracted_info = ImageExtractor(image_container.image)
-    sudoku_solver = SudokuSolver(extracted_info.starting_grid)
-    board_is_valid = sudoku_solver.board_is_valid()
+    if settings.MULTI_GRID:
+        # Solve every sudoku on the page and draw all solutions
+        try:
+            page = PageExtractor(image_container.image, config=config)
+        except SudokuError as e:
+            if settings.VERBOSE_EXIT:
+                print("ERROR -- %s" % e)
+            exit()
+        rendered = image_container.image
+        for i, (grid, solution) in enumerate(page.solve_all()):
+            if solution is None:
+                if settings.VERBOSE_EXIT:
+                    print("ERROR -- Sudoku %d could not be solved." % (i + 1))
+                continue
+            if config.enable_debug:
+                print("DEBUG -- Solution to sudoku %d was found:" % (i + 1))
+                SudokuSolver(solution).print_sudoku()
+            rendered = render_solution(image=rendered,
+                                       warp_matrix=grid.warp_matrix,
+                                       warp_shape=grid.warp.shape,
+                                       start_grid=grid.starting_grid,
+                                       solution=solution)
+        if settings.SOLUTION_OUTPUT:
+            save_image(rendered, settings.SOLUTION_OUTPUT)
+        else:
+            image_preview(rendered)
+        exit()
 
-    if not board_is_valid:
+    try:
+        extracted_info = ImageExtractor(image_container.image, config=config)
+    except SudokuError as e:
         if settings.VERBOSE_EXIT:
-            print("ERROR -- Starting values found in sudoku were not valid.")
-            print("The following board was found: ")
-            sudoku_solver.print_sudoku()
+            print("ERROR -- %s" % e)
         exit()
-
-    if settings.ENABLE_DEBUG:
+    start_grid = extracted_info.starting_grid
+    if config.enable_board_repair:
+        # Read suspect squares again if the board is invalid or does not
+        # have a unique solution. None means it could not be repaired.
+        start_grid = (BoardRepairer(extracted_info).repair() or
+                      extracted_info.starting_grid)
+    if config.enable_debug:
         print("DEBUG -- Following starting board was found: ")
-        sudoku_solver.print_sudoku()
-
-    if settings.ENABLE_DEBUG:
+        SudokuSolver(start_grid).print_sudoku()
         print("DEBUG -- Attempting to solve the sudoku.")
 
-    sudoku_solver.solve(sudoku_solver.board)
+    try:
+        with tracing.span("solve"):
+            sudoku_solver = solve_sudoku(start_grid,
+                                         debug=config.enable_debug)
+    except SudokuError as e:
+        if settings.VERBOSE_EXIT:
+            print("ERROR -- %s" % e)
+            if isinstance(e, InvalidBoardError):
+                print("The following board was found: ")
+                SudokuSolver(start_grid).print_sudoku()
+        exit()
 
-    if settings.ENABLE_DEBUG:
+    if config.enable_debug:
         print("DEBUG -- Solution to sudoku was found:")
         sudoku_solver.print_sudoku()
+        print("DEBUG -- Sudoku succesfully solved.")
 
-    # Write the solution to the image and preview it.
-    if sudoku_solver.is_solved:
-        if settings.ENABLE_DEBUG:
-            print("DEBUG -- Sudoku succesfully solved.")
-
+    if settings.SOLUTION_OUTPUT:
+        # Draw the solution onto the original photo and save it
+        rendered = render_solution(image=extracted_info.original_image,
+                                   warp_matrix=extracted_info.warp_matrix,
+                                   warp_shape=extracted_info.warp.shape,
+                                   start_grid=start_grid,
+                                   solution=sudoku_solver.board)
+        save_image(rendered, settings.SOLUTION_OUTPUT)
     else:
-        if settings.VERBOSE_EXIT:
-            print("ERROR -- Sudoku could not be solved.")
-        exit()
+        display_solution(square_borders=extracted_info.square_borders,
+                         start_grid=start_grid,
+                         solution=sudoku_solver.board,
+                         image=extracted_info.warp)
 
-    display_solution(square_borders=extracted_info.square_borders,
-                     start_grid=extracted_info.starting_grid,
-                     solution=sudoku_solver.board,
-                     image=extracted_info.warp)
-
-    if settings.ENABLE_DEBUG:
+    if config.enable_debug:
         print("DEBUG GLOBAL -- Script finished execution.")
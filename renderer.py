@@ -0,0 +1,139 @@
+""" Headless rendering of a solution onto the original photo.
+
+    Unlike display_solution in helper_functions, nothing is shown on screen,
+    so this can be used in batch scripts and the solving server. Instead of
+    drawing every digit separately, each digit is rasterized once into a
+    sprite (per square size) and all missing digits are composited into a
+    mask in a single numpy operation. The mask is then warped back onto the
+    original image, using the inverse of the perspective transform that was
+    used to extract the grid (ImageExtractor.warp_matrix), and the digits
+    are painted with masked OpenCV operations. The mask is binary and warped
+    with nearest neighbour interpolation, which keeps a render below 1 ms
+    for a photo of about 800x700 at the cost of anti-aliased digit edges.
+
+    Usage:
+        image = render_solution(extracted_info.original_image,
+                                extracted_info.warp_matrix,
+                                extracted_info.warp.shape,
+                                extracted_info.starting_grid,
+                                sudoku_solver.board)
+        png_bytes = encode_image(image) """
+from lazy_imports import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# Digit sprites per square size, see digit_sprites
+_sprite_cache = {}
+# Images filled with a single color per color, see color_block
+_color_cache = {}
+
+
+def digit_sprites(square_size):
+    """ Returns an array of 10 sprites (square_size x square_size binary
+        masks) in which sprite n holds the digit n. Sprite 0 is empty.
+        Digits are positioned and styled like in display_solution. The
+        sprites are only rasterized the first time a size is requested. """
+    sprites = _sprite_cache.get(square_size)
+    if sprites is None:
+        sprites = np.zeros((10, square_size, square_size), dtype=np.uint8)
+        org = (square_size // 2 - 10, square_size // 2 + 10)
+        for digit in range(1, 10):
+            cv2.putText(
+                img=sprites[digit],
+                text=str(digit),
+                org=org,
+                fontFace=cv2.FONT_HERSHEY_SIMPLEX,
+                fontScale=1,
+                color=255,
+                thickness=2)
+        _sprite_cache[square_size] = sprites
+    return sprites
+
+
+def color_block(color, height, width):
+    """ Returns an image of at least height x width, filled with the given
+        (B, G, R) color. The image is cached and only grows when a bigger
+        one is requested, so it should only be read from. """
+    block = _color_cache.get(color)
+    if (block is None or block.shape[0] < height or
+            block.shape[1] < width):
+        if block is not None:
+            height = max(height, block.shape[0])
+            width = max(width, block.shape[1])
+        block = np.empty((height, width, 3), dtype=np.uint8)
+        block[:] = color
+        _color_cache[color] = block
+    return block
+
+
+def solution_overlay(start_grid, solution, warp_size):
+    """ Returns a mask the size of the warped grid, holding every digit
+        of the solution that was not part of the start grid. """
+    square_size = warp_size // 9
+    digits = np.array(solution, dtype=np.intp)
+    # Given digits are not drawn, so they use the empty sprite
+    digits[np.array(start_grid) != 0] = 0
+    sprites = digit_sprites(square_size)
+    # (row, col, y, x) -> (row, y, col, x) -> full grid
+    overlay = sprites[digits].transpose(0, 2, 1, 3).reshape(
+        9 * square_size, 9 * square_size)
+    if overlay.shape[0] != warp_size:
+        overlay = cv2.copyMakeBorder(overlay, 0, warp_size - overlay.shape[0],
+                                     0, warp_size - overlay.shape[1],
+                                     cv2.BORDER_CONSTANT, value=0)
+    return overlay
+
+
+def render_solution(image, warp_matrix, warp_shape, start_grid, solution,
+                    color=(0, 255, 0)):
+    """ Returns a copy of the image with the missing digits of the solution
+        drawn in perspective on top of the sudoku grid.
+        Params:
+            image        -- The image the grid was extracted from
+            warp_matrix  -- Transformation from image to warped grid
+            warp_shape   -- Shape of the warped grid
+            start_grid   -- A list containing the sudoku starting values
+            solution     -- A list containing the sudoku solution
+            color        -- The (B, G, R) color of the digits """
+    overlay = solution_overlay(start_grid, solution, warp_shape[0])
+    inverse = np.linalg.inv(warp_matrix)
+
+    # Only warp the region of the image that is covered by the grid
+    size = float(warp_shape[0])
+    corners = np.array([[[0, 0], [size, 0], [size, size], [0, size]]])
+    projected = cv2.perspectiveTransform(corners, inverse)[0]
+    height, width = image.shape[:2]
+    x0, y0 = np.maximum(np.floor(projected.min(axis=0)), 0).astype(int)
+    x1, y1 = np.minimum(np.ceil(projected.max(axis=0)) + 1,
+                        [width, height]).astype(int)
+    result = image.copy()
+    if x1 <= x0 or y1 <= y0:
+        return result
+    translate = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]],
+                         dtype=np.float64)
+    mask = cv2.warpPerspective(overlay, np.dot(translate, inverse),
+                               (int(x1 - x0), int(y1 - y0)),
+                               flags=cv2.INTER_NEAREST)
+
+    # Paint the digits, only where the mask is set
+    height, width = mask.shape
+    block = color_block(tuple(color), height, width)
+    cv2.copyTo(block[:height, :width], mask, result[y0:y1, x0:x1])
+    return result
+
+
+def encode_image(image, extension='.png'):
+    """ Encodes the image in the format given by the file extension
+        (.png, .jpg etc.) and returns the encoded bytes. """
+    success, buffer = cv2.imencode(extension, image)
+    if not success:
+        raise ValueError("Could not encode image as %s." % extension)
+    return buffer.tobytes()
+
+
+def save_image(image, path):
+    """ Writes the image to the given path. The format is determined
+        by the file extension. """
+    if not cv2.imwrite(path, image):
+        raise IOError("Could not write image to %s." % path)
@@ -0,0 +1,505 @@
+"""
+Long-running local solving service.
+
+Instead of starting a new interpreter (and importing OpenCV, numpy, PIL and
+pytesseract) for every photo, this script keeps a pool of worker processes
+running. Each worker loads the image pipeline once when it starts, after
+which requests are handed to the workers as they come in.
+
+Endpoints (responses are JSON, unless stated otherwise):
+    POST /solve/image  -- Request body is an encoded image (jpg, png etc.)
+    POST /render/image -- Like /solve/image, but responds with the image
+                          (png) with the solution drawn on top of it
+    POST /solve/text   -- Request body is a sudoku as 81 values, row by row.
+                          0 or . represent an empty square, other characters
+                          such as whitespace are ignored.
+    GET  /metrics      -- Request counters, latencies and pool status
+
+Some pipeline settings (see Config in settings.py) can be changed for a
+single request in the query string, for example:
+    POST /solve/image?blur_kernel_size=[7,7]&min_ocr_confidence=70
+The settings that can be changed, and their allowed values, are listed in
+REQUEST_SETTINGS. Anything else is refused with a 400.
+
+At most SERVER_MAX_PENDING requests are accepted at the same time (running
+plus waiting for a worker). Additional requests are refused with a 503.
+A request that takes longer than SERVER_TIMEOUT seconds is answered with
+a 504. The worker running the timed out job is stopped, after which the
+pool starts a new one, so a stuck image does not keep a worker busy for
+the requests waiting behind it. A timed out job that is still waiting for
+a worker is stopped as soon as a worker starts it. Either way its slot is
+freed, also when its worker crashed (or was killed when out of memory).
+
+When the image pipeline can not be loaded (OpenCV or pytesseract is not
+installed, for example), sudokus given as text are still solved and image
+requests are answered with a 503.
+
+With ENABLE_TRACING on, the spans recorded while handling a request are
+returned in the "trace" field of the JSON response.
+
+Run:
+    $ python server.py
+"""
+from copy import deepcopy
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import settings
+import tracing
+from errors import InvalidBoardError, SudokuError, UnsolvableError
+from SudokuSolver import parse_grid, solve_sudoku
+from renderer import render_solution, encode_image
+
+try:  # Python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:  # Python 3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+try:  # Python 2
+    from urlparse import urlparse, parse_qsl
+except ImportError:  # Python 3
+    from urllib.parse import urlparse, parse_qsl
+try:  # Python 2
+    from Queue import Empty
+except ImportError:  # Python 3
+    from queue import Empty
+
+# Settings a client may change per request: name -> (type, minimum,
+# maximum). The limits keep a single request from occupying a worker for
+# long, for example with a huge image or board repair search.
+REQUEST_SETTINGS = {
+    'blur_kernel_size': (tuple, 1, 15),  # Odd width and height
+    'enable_board_repair': (bool, None, None),
+    'min_ocr_confidence': (float, 0, 100),
+    'max_reread_squares': (int, 0, 6),
+    'max_repair_changes': (int, 1, 3),
+    'max_height_allowed': (int, 100, 1800),
+    'max_width_allowed': (int, 100, 1800),
+}
+
+# Image pipeline classes, loaded once per worker process by warm_up_worker.
+_ImagePrepper = None
+_ImageExtractor = None
+_BoardRepairer = None
+# Why the image pipeline could not be loaded, None if it was loaded
+_pipeline_error = None
+# Queue on which a worker reports the jobs it starts, see SolvingService
+_started_jobs = None
+
+
+def warm_up_worker(started_jobs=None):
+    """ Initializer of every worker process. Imports the image pipeline
+        (and with it OpenCV, numpy, PIL and pytesseract) and runs the
+        solver and the OCR engine once, so the first real request does not
+        pay for any of it. Never raises: the pool would keep replacing a
+        worker whose initializer fails, so a missing dependency only
+        disables the image requests. """
+    global _ImagePrepper, _ImageExtractor, _BoardRepairer
+    global _pipeline_error, _started_jobs
+    _started_jobs = started_jobs
+    solve_sudoku(parse_grid('0' * 81))
+
+    try:
+        import numpy as np
+        from ImagePrepper import ImagePrepper
+        from ImageExtractor import ImageExtractor
+        from BoardRepairer import BoardRepairer
+        from lazy_imports import preload_all
+        # The pipeline imports its dependencies lazily, load them right away
+        preload_all()
+    except Exception as e:
+        _pipeline_error = str(e) or type(e).__name__
+        return
+    _ImagePrepper, _ImageExtractor = ImagePrepper, ImageExtractor
+    _BoardRepairer = BoardRepairer
+
+    try:
+        extractor = ImageExtractor.__new__(ImageExtractor)
+        extractor.read_square(np.zeros((38, 38), dtype=np.uint8))
+    except Exception:
+        # A missing OCR engine will surface again on the first request
+        pass
+
+
+def solve_board(start_grid):
+    """ Validates and solves the given board. Returns the result
+        dictionary that is sent back to the client. """
+    try:
+        solver = solve_sudoku(start_grid)
+    except (InvalidBoardError, UnsolvableError) as e:
+        return {'status': 422, 'error': str(e), 'start_grid': start_grid}
+    return {'status': 200, 'start_grid': start_grid,
+            'solution': solver.board}
+
+
+def solve_job(job_id, kind, payload, config):
+    """ Runs in a worker process. Solves the sudoku in the payload, either
+        encoded image bytes (kind 'image' or 'render') or text (kind 'text'),
+        using the settings in the given config. For kind 'render', the
+        result also holds the original image with the solution drawn on it,
+        encoded as png. Never raises: errors are returned as part of the
+        result, so the pool and its workers survive bad input. """
+    if _started_jobs is not None:
+        _started_jobs.put((job_id, os.getpid()))
+    # Spans are returned with the result instead of being kept, otherwise
+    # a long-running worker would collect them forever.
+    tracing.reset()
+    result = run_job(kind, payload, config)
+    if tracing.ENABLED:
+        result['trace'] = tracing.to_json()
+        tracing.reset()
+    return result
+
+
+def run_job(kind, payload, config):
+    """ Does the actual work of solve_job and returns its result. """
+    try:
+        if kind == 'text':
+            return solve_board(parse_grid(payload))
+        if _ImagePrepper is None:
+            return {'status': 503, 'error': 'Image pipeline is not'
+                    ' available (%s).' % _pipeline_error}
+        image_container = _ImagePrepper(img_bytes=payload, config=config)
+        extracted_info = _ImageExtractor(deepcopy(image_container.image),
+                                         config=config)
+        start_grid = extracted_info.starting_grid
+        if config.enable_board_repair:
+            start_grid = (_BoardRepairer(extracted_info).repair() or
+                          start_grid)
+        result = solve_board(start_grid)
+        if kind == 'render' and result['status'] == 200:
+            rendered = render_solution(extracted_info.original_image,
+                                       extracted_info.warp_matrix,
+                                       extracted_info.warp.shape,
+                                       result['start_grid'],
+                                       result['solution'])
+            result['image'] = encode_image(rendered)
+        return result
+    except SudokuError as e:
+        return {'status': 422, 'error': str(e)}
+    except ValueError as e:
+        return {'status': 400, 'error': str(e)}
+    except Exception as e:
+        return {'status': 422,
+                'error': 'Could not process input (%s).' % type(e).__name__}
+
+
+def check_request_setting(name, value):
+    """ Raises a ValueError if the setting may not be changed per request,
+        or if the value is of the wrong type or out of range. """
+    if name not in REQUEST_SETTINGS:
+        raise ValueError("Setting can not be changed per request: %s" % name)
+    kind, minimum, maximum = REQUEST_SETTINGS[name]
+    if kind is bool:
+        if not isinstance(value, bool):
+            raise ValueError("%s must be true or false." % name)
+        return
+    if kind is tuple:
+        if (not isinstance(value, tuple) or len(value) != 2 or
+                not all(isinstance(v, int) and not isinstance(v, bool) and
+                        v % 2 == 1 for v in value)):
+            raise ValueError("%s must be a list of two odd numbers."
+                             % name)
+        values = value
+    else:
+        numbers = (int, float) if kind is float else (int,)
+        if not isinstance(value, numbers) or isinstance(value, bool):
+            raise ValueError("%s must be %s." % (
+                name, 'an integer' if kind is int else 'a number'))
+        values = (value,)
+    if not all(minimum <= v <= maximum for v in values):
+        raise ValueError("%s must be between %s and %s."
+                         % (name, minimum, maximum))
+
+
+def parse_overrides(query):
+    """ Parses settings from the query string of a request, such as
+        ?blur_kernel_size=[7,7]&enable_board_repair=false. Values are
+        read as JSON (lists become tuples); anything else is a string. """
+    overrides = {}
+    for name, value in parse_qsl(query):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        overrides[name] = tuple(value) if isinstance(value, list) else value
+    return overrides
+
+
+class Metrics(object):
+    """ Thread-safe request counters for the /metrics endpoint. """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.stopped_workers = 0
+        self.by_status = {}
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def begin(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def end(self, status, latency):
+        with self.lock:
+            self.in_flight -= 1
+            self.by_status[status] = self.by_status.get(status, 0) + 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if status == 504:
+                self.timeouts += 1
+
+    def reject(self):
+        """ Counts a request that was refused because the service was
+            full. Other 503 responses are not counted. """
+        with self.lock:
+            self.rejected += 1
+
+    def stop_worker(self):
+        with self.lock:
+            self.stopped_workers += 1
+
+    def snapshot(self):
+        with self.lock:
+            finished = sum(self.by_status.values())
+            return {
+                'uptime_s': time.time() - self.started,
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'stopped_workers': self.stopped_workers,
+                'by_status': dict((str(k), v)
+                                  for k, v in self.by_status.items()),
+                'latency_avg_ms': (self.latency_total / finished * 1000.0
+                                   if finished else 0.0),
+                'latency_max_ms': self.latency_max * 1000.0}
+
+
+class SolvingService(object):
+    """ Hands jobs to a pool of pre-warmed worker processes, while
+        limiting the amount of pending jobs. """
+
+    def __init__(self, workers=None, max_pending=None, timeout=None):
+        # Previews are disabled, since a worker has no one to show them to
+        self.config = settings.load_config(enable_preview=False,
+                                           enable_preview_all=False,
+                                           enable_ocr_debug=False)
+        self.workers = workers or settings.SERVER_WORKERS
+        self.max_pending = max_pending or settings.SERVER_MAX_PENDING
+        self.timeout = timeout or settings.SERVER_TIMEOUT
+        # Workers report the jobs they start, so timed out jobs can be
+        # stopped
+        self.started_jobs = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool(self.workers,
+                                         initializer=warm_up_worker,
+                                         initargs=(self.started_jobs,))
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        # Unfinished jobs: job id -> pid of the worker running it (None
+        # while waiting for a worker)
+        self.running = {}
+        # Timed out jobs that are still waiting for a worker
+        self.abandoned = set()
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count()
+        self.metrics = Metrics()
+        tracker = threading.Thread(target=self.track_jobs)
+        tracker.daemon = True
+        tracker.start()
+
+    def track_jobs(self):
+        """ Runs in a thread. Stores which worker started which job. """
+        while True:
+            try:
+                job_id, pid = self.started_jobs.get()
+            except (EOFError, IOError, OSError):
+                return  # The queue was closed
+            with self.lock:
+                if job_id in self.abandoned:
+                    self.abandoned.discard(job_id)
+                elif job_id in self.running:
+                    self.running[job_id] = pid
+                    continue
+                else:
+                    continue
+            # Nobody waits for the result anymore
+            self.stop_worker(pid)
+            self.finish_job(job_id)
+
+    def stop_worker(self, pid):
+        """ Kills the worker process with the given pid. The pool replaces
+            it with a new worker; the job it was running is lost. """
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass  # The worker already stopped
+        self.metrics.stop_worker()
+
+    def finish_job(self, job_id):
+        """ Frees the slot of the job. Does nothing if it was already
+            freed, since a job can finish after it timed out. """
+        with self.lock:
+            if job_id not in self.running:
+                return
+            del self.running[job_id]
+        self.slots.release()
+
+    def abandon_job(self, job_id):
+        """ Called when the request of the job timed out. Stops the worker
+            running the job, or marks the job to be stopped as soon as a
+            worker starts it. """
+        with self.lock:
+            if job_id not in self.running:
+                return  # Finished after all
+            pid = self.running[job_id]
+            if pid is None:
+                self.abandoned.add(job_id)
+                return
+        self.stop_worker(pid)
+        self.finish_job(job_id)
+
+    def request_config(self, overrides):
+        """ Returns the config for a single request: the config of the
+            service with the given settings overridden. Raises a
+            ValueError for settings that may not be changed per request
+            (see REQUEST_SETTINGS) or values that are not allowed. """
+        for name in sorted(overrides):
+            check_request_setting(name, overrides[name])
+        return self.config._replace(**overrides)
+
+    def submit(self, kind, payload, config=None):
+        """ Runs a job on the pool and waits for its result, using the
+            given config or the config of the service. Returns a result
+            dictionary containing at least a status. """
+        if not self.slots.acquire(False):
+            self.metrics.reject()
+            return {'status': 503, 'error': 'Too many pending requests.'}
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.running[job_id] = None
+        # The slot is released by a callback once the worker is done, or
+        # when the job is stopped after this request timed out.
+        callbacks = {'callback': lambda result: self.finish_job(job_id)}
+        if sys.version_info[0] >= 3:
+            callbacks['error_callback'] = (
+                lambda error: self.finish_job(job_id))
+        job = self.pool.apply_async(
+            solve_job, (job_id, kind, payload, config or self.config),
+            **callbacks)
+        try:
+            return job.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            self.abandon_job(job_id)
+            return {'status': 504, 'error': 'Request timed out.'}
+        except Exception as e:
+            # solve_job never raises, so the job itself could not be
+            # handed to or returned from the worker
+            self.finish_job(job_id)
+            return {'status': 500, 'error': 'Could not run request (%s).'
+                    % type(e).__name__}
+
+    def status(self):
+        """ Returns the metrics, including the pool configuration. """
+        metrics = self.metrics.snapshot()
+        metrics.update({'workers': self.workers,
+                        'max_pending': self.max_pending,
+                        'timeout_s': self.timeout})
+        return metrics
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class SolvingRequestHandler(BaseHTTPRequestHandler):
+    """ Maps the HTTP endpoints onto the SolvingService of the server. """
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_image(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.server.service.status())
+        else:
+            self.send_json(404, {'error': 'Unknown endpoint.'})
+
+    def do_POST(self):
+        kinds = {'/solve/image': 'image', '/render/image': 'render',
+                 '/solve/text': 'text'}
+        url = urlparse(self.path)
+        if url.path not in kinds:
+            self.send_json(404, {'error': 'Unknown endpoint.'})
+            return
+        kind = kinds[url.path]
+        service = self.server.service
+        start = time.time()
+        service.metrics.begin()
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = self.rfile.read(length)
+        if kind == 'text':
+            payload = payload.decode('utf-8', 'replace')
+        try:
+            config = service.request_config(parse_overrides(url.query))
+        except ValueError as e:
+            result = {'status': 400, 'error': str(e)}
+        else:
+            result = service.submit(kind, payload, config)
+        status = result.pop('status')
+        service.metrics.end(status, time.time() - start)
+        if 'image' in result:
+            self.send_image(status, result['image'])
+        else:
+            self.send_json(status, result)
+
+    def log_message(self, format, *args):
+        if settings.ENABLE_DEBUG:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class SolvingServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server handling every connection in its own thread, so slow
+        requests do not block the /metrics endpoint or other requests. """
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        HTTPServer.__init__(self, address, SolvingRequestHandler)
+        self.service = service
+
+
+if __name__ == "__main__":
+    service = SolvingService()
+    server = SolvingServer((settings.SERVER_HOST, settings.SERVER_PORT),
+                           service)
+    print("Serving on http://%s:%d with %d workers."
+          % (settings.SERVER_HOST, settings.SERVER_PORT, service.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
@@ -7,6 +7,8 @@ Change the settings here to adjust how the script is run.
 This software was created for educational purposes. The license as available
 within this folder applies. Software is provided as-is. USE AT YOUR OWN RISK.
 '''
+from collections import namedtuple
+
 FILE_NAME = 'sudoku_skewed.jpg'
 ENABLE_PREVIEW = True  # Preview important intermediary CV2 filters/results
 ENABLE_PREVIEW_ALL = False  # Preview ALL cv2 filters/results
@@ -14,8 +16,72 @@ ENABLE_PREVIEW_ALL = False  # Preview ALL cv2 filters/results
 ENABLE_DEBUG = False
 ENABLE_OCR_DEBUG = True  # Show intermediary OCR results in terminal
 VERBOSE_EXIT = True  # When enabled, print an error upon execution fails
+# When set, the solution is drawn onto the original image and saved to this
+# file (.png, .jpg etc.) instead of being shown in a window.
+SOLUTION_OUTPUT = None
 
 # Open CV settings
 MAX_HEIGHT_ALLOWED = 900  # The maximum allowed height of a loaded image
 MAX_WIDTH_ALLOWED = 900  # The maximum allowed width of a loaded image
 BLUR_KERNEL_SIZE = (5, 5)  # The kernel sized used for the blur filter
+
+# Tracing and profiling settings
+ENABLE_TRACING = False  # Record a span for every pipeline stage
+TRACE_OUTPUT = 'trace.json'  # The file the recorded spans are written to
+TRACE_FORMAT = 'chrome'  # 'chrome' (chrome://tracing) or 'json'
+ENABLE_PROFILING = False  # Run cProfile during the whole script execution
+PROFILE_OUTPUT = 'profile.pstats'  # The file the cProfile stats are dumped to
+
+# Solving server settings (server.py)
+SERVER_HOST = '127.0.0.1'  # Only listen on localhost
+SERVER_PORT = 8080  # The port the server listens on
+SERVER_WORKERS = 4  # The amount of pre-warmed worker processes
+SERVER_MAX_PENDING = 32  # Max requests running or waiting for a worker
+SERVER_TIMEOUT = 30  # Seconds before a request is answered with a timeout
+
+# OCR repair settings (BoardRepairer.py)
+# Try to repair misread squares when the found board is invalid or
+# does not have exactly one solution, instead of giving up.
+ENABLE_BOARD_REPAIR = True
+MIN_OCR_CONFIDENCE = 60  # Squares read with lower confidence are suspect
+MAX_REREAD_SQUARES = 6  # The maximum amount of squares that is read again
+MAX_REPAIR_CHANGES = 3  # The maximum amount of squares changed in a repair
+
+# Page settings (PageExtractor.py), used when MULTI_GRID is enabled
+MULTI_GRID = False  # Find, solve and draw every sudoku in the image
+MIN_GRID_AREA_RATIO = 0.01  # Minimal grid area, as fraction of the image
+MAX_GRID_ASPECT_DEVIATION = 0.25  # Max deviation of width/height from 1
+MIN_GRID_LINES = 8  # Grid lines (of 10) required in both directions
+PAGE_WORKERS = 4  # Threads/processes used to read and solve the grids
+
+
+# The settings above are the defaults. The image pipeline (ImagePrepper,
+# ImageExtractor, PageExtractor and BoardRepairer) does not read them
+# directly, but receives an immutable Config object. That way, pipelines
+# with different settings can run side by side in one process.
+PIPELINE_SETTINGS = (
+    'enable_preview', 'enable_preview_all', 'enable_debug',
+    'enable_ocr_debug', 'max_height_allowed', 'max_width_allowed',
+    'blur_kernel_size', 'enable_board_repair', 'min_ocr_confidence',
+    'max_reread_squares', 'max_repair_changes', 'min_grid_area_ratio',
+    'max_grid_aspect_deviation', 'min_grid_lines', 'page_workers')
+
+
+class Config(namedtuple('Config', PIPELINE_SETTINGS)):
+    ''' Immutable pipeline settings. Fields are the lowercase names of
+        the settings above. Use load_config to create one, and
+        config._replace(name=value) for a copy with other values. '''
+    __slots__ = ()
+
+
+def load_config(**overrides):
+    ''' Returns a Config holding the current values of the settings in
+        this module, with the given (lowercase) settings overridden.
+        Raises a ValueError for an unknown setting. '''
+    unknown = set(overrides) - set(PIPELINE_SETTINGS)
+    if unknown:
+        raise ValueError("Unknown settings: %s" % ', '.join(sorted(unknown)))
+    values = dict((name, globals()[name.upper()])
+                  for name in PIPELINE_SETTINGS)
+    values.update(overrides)
+    return Config(**values)
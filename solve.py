@@ -0,0 +1,75 @@
+"""
+Solver-only entry point, for sudokus that are already available as text.
+
+Only the solver is imported, not the image pipeline (OpenCV, numpy, PIL,
+pytesseract), so this script starts in milliseconds and is suitable for
+short-lived batch processes.
+
+Each sudoku is given as 81 values, row by row. Digits 1-9 are given values,
+0 and . represent empty squares and any other character is ignored. An input
+can hold any number of sudokus; every 81 values form the next sudoku. The
+solution of each sudoku is printed as one line of 81 digits.
+
+Usage:
+    $ python solve.py puzzles.txt
+    $ echo 53..7....6..195....98....6.8...6...34..8.3..17...2...6.6....28....419..5....8..79 | python solve.py
+"""
+import argparse
+import sys
+from errors import SudokuError
+from SudokuSolver import solve_sudoku, parse_grid, grid_to_text
+
+
+def split_puzzles(text):
+    """ Splits the given text into the texts of the individual sudokus,
+        81 values each. Raises a ValueError if values are left over. """
+    values = [char for char in text if char == '.' or char.isdigit()]
+    if len(values) % 81 != 0:
+        raise ValueError("Input holds %d values, which is not a multiple"
+                         " of 81." % len(values))
+    return [''.join(values[i:i + 81]) for i in range(0, len(values), 81)]
+
+
+def read_input(name):
+    """ Returns the contents of the file with the given name, or of stdin
+        if the name is None. """
+    if name is None:
+        return sys.stdin.read()
+    with open(name) as puzzle_file:
+        return puzzle_file.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solve sudokus given as text.")
+    parser.add_argument('files', nargs='*',
+                        help="Files holding sudokus (default: stdin)")
+    parser.add_argument('--pretty', action='store_true',
+                        help="Print solutions as a grid instead of a line")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for name in args.files or [None]:
+        try:
+            text = read_input(name)
+            puzzles = split_puzzles(text)
+        except (IOError, OSError, ValueError) as e:
+            sys.stderr.write("ERROR -- %s\n" % e)
+            failures += 1
+            continue
+        for puzzle in puzzles:
+            try:
+                solver = solve_sudoku(parse_grid(puzzle))
+            except SudokuError as e:
+                sys.stderr.write("ERROR -- %s Puzzle: %s\n" % (e, puzzle))
+                failures += 1
+                continue
+            if args.pretty:
+                solver.print_sudoku()
+            else:
+                print(grid_to_text(solver.board))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
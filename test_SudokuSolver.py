@@ -0,0 +1,128 @@
+"""
+Tests for the solution counting and conflict detection of SudokuSolver,
+which board repair relies on, and for solve_sudoku.
+
+Run:
+    $ python -m unittest test_SudokuSolver
+"""
+import time
+import unittest
+from errors import InvalidBoardError, UnsolvableError
+from SudokuSolver import SudokuSolver, parse_grid, grid_to_text, solve_sudoku
+
+PUZZLE = ('53..7....6..195....98....6.8...6...3'
+          '4..8.3..17...2...6.6....28....419..5....8..79')
+SOLUTION = ('534678912672195348198342567859761423'
+            '426853791713924856961537284287419635345286179')
+# Takes the brute-force solve of SudokuSolver about a second
+HARD_PUZZLE = ('8..........36......7..9.2...5...7.......457.....1...3'
+               '...1....68..85...1..9....4..')
+# Needs a lot of backtracking when squares are filled in order
+SPARSE_PUZZLE = ('..............3.85..1.2.......5.7.....4...1...9.......'
+                 '5......73..2.1........4...9')
+
+
+def count(text, limit=2):
+    solver = SudokuSolver(parse_grid(text))
+    return solver.count_solutions(solver.board, limit)
+
+
+class CountSolutionsTest(unittest.TestCase):
+
+    def test_unique_puzzle(self):
+        self.assertEqual(count(PUZZLE), 1)
+
+    def test_solved_board(self):
+        self.assertEqual(count(SOLUTION), 1)
+
+    def test_multiple_solutions(self):
+        # Without the 7 in the last row the puzzle has two solutions
+        text = PUZZLE[:-2] + '.' + PUZZLE[-1:]
+        self.assertEqual(count(text), 2)
+
+    def test_empty_board_stops_at_limit(self):
+        self.assertEqual(count('.' * 81), 2)
+        self.assertEqual(count('.' * 81, limit=5), 5)
+
+    def test_no_solution(self):
+        # A 1 fits the square in the top row, but the solution has a 4
+        text = PUZZLE[:2] + '1' + PUZZLE[3:]
+        self.assertEqual(SudokuSolver(parse_grid(text)).conflicting_cells(),
+                         [])
+        self.assertEqual(count(text), 0)
+
+    def test_no_solution_on_nearly_empty_board(self):
+        # The 1s in rows 1 and 2 and columns 0 and 1, and the 2 in the
+        # top row, leave no room for a 1 in the top left box
+        text = list('.' * 81)
+        for i, value in ((2, '2'), (12, '1'), (24, '1'), (36, '1'),
+                         (64, '1')):
+            text[i] = value
+        self.assertEqual(count(''.join(text)), 0)
+
+    def test_board_is_unchanged(self):
+        board = parse_grid(PUZZLE)
+        SudokuSolver(board).count_solutions(board)
+        self.assertEqual(grid_to_text(board), PUZZLE.replace('.', '0'))
+
+    def test_hard_puzzles_are_fast(self):
+        start = time.time()
+        self.assertEqual(count(HARD_PUZZLE), 1)
+        self.assertEqual(count(SPARSE_PUZZLE), 1)
+        self.assertLess(time.time() - start, 5)
+
+
+class SolveSudokuTest(unittest.TestCase):
+
+    def test_solution(self):
+        solver = solve_sudoku(parse_grid(PUZZLE))
+        self.assertTrue(solver.is_solved)
+        self.assertEqual(grid_to_text(solver.board), SOLUTION)
+
+    def test_hard_puzzles_are_fast(self):
+        start = time.time()
+        for text in (HARD_PUZZLE, SPARSE_PUZZLE):
+            solver = solve_sudoku(parse_grid(text))
+            self.assertEqual(solver.conflicting_cells(), [])
+            solution = grid_to_text(solver.board)
+            self.assertNotIn('0', solution)
+            self.assertTrue(all(given in '.' + found for given, found
+                                in zip(text, solution)))
+        self.assertLess(time.time() - start, 5)
+
+    def test_invalid_board(self):
+        self.assertRaises(InvalidBoardError, solve_sudoku,
+                          parse_grid('11' + PUZZLE[2:]))
+
+    def test_no_solution(self):
+        self.assertRaises(UnsolvableError, solve_sudoku,
+                          parse_grid(PUZZLE[:2] + '1' + PUZZLE[3:]))
+
+
+class ConflictingCellsTest(unittest.TestCase):
+
+    def test_valid_board(self):
+        self.assertEqual(SudokuSolver(parse_grid(PUZZLE)).conflicting_cells(),
+                         [])
+
+    def test_row_conflict(self):
+        text = '5' + PUZZLE[1:7] + '5' + PUZZLE[8:]
+        self.assertEqual(SudokuSolver(parse_grid(text)).conflicting_cells(),
+                         [(0, 0), (0, 7)])
+
+    def test_column_and_box_conflicts(self):
+        board = parse_grid(PUZZLE)
+        board[8][0] = 4  # Column 0 already holds a 4 in row 4
+        board[7][7] = 2  # The bottom right box already holds a 2
+        self.assertEqual(SudokuSolver(board).conflicting_cells(),
+                         [(4, 0), (6, 6), (7, 7), (8, 0)])
+
+    def test_board_is_unchanged(self):
+        board = parse_grid(PUZZLE)
+        board[0][2] = 5
+        SudokuSolver(board).conflicting_cells()
+        self.assertEqual(board[0][2], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Tests for the job handling of the solving server: timed out jobs, freeing
+pending slots and the request counters.
+
+Run:
+    $ python -m unittest test_server
+"""
+import multiprocessing
+import threading
+import time
+import unittest
+import server
+from test_SudokuSolver import PUZZLE
+
+run_job = server.run_job
+
+
+def fake_run_job(kind, payload, config):
+    """ Takes forever for the payload 'sleep', and answers image requests
+        as if the image pipeline is not available. """
+    if payload == 'sleep':
+        time.sleep(60)
+    if kind == 'image':
+        return {'status': 503, 'error': 'Image pipeline is not available.'}
+    return run_job(kind, payload, config)
+
+
+# The workers only use the fake job when they are forked from this process
+FORK = getattr(multiprocessing, 'get_start_method', lambda: 'fork')() == 'fork'
+
+
+@unittest.skipUnless(FORK, "Workers must be forked to use the fake job")
+class SolvingServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        server.run_job = fake_run_job
+        self.service = server.SolvingService(workers=1, max_pending=2,
+                                             timeout=1)
+
+    def tearDown(self):
+        self.service.close()
+        server.run_job = run_job
+
+    def submit_in_thread(self, payload):
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(
+                self.service.submit('text', payload)))
+        thread.start()
+        return thread, results
+
+    def test_text_request(self):
+        result = self.service.submit('text', PUZZLE)
+        self.assertEqual(result['status'], 200)
+
+    def test_timed_out_job_stops_worker(self):
+        self.assertEqual(self.service.submit('text', 'sleep')['status'], 504)
+        # The worker was replaced, so requests waiting behind it run
+        for _ in range(3):
+            self.assertEqual(self.service.submit('text', PUZZLE)['status'],
+                             200)
+        metrics = self.service.status()
+        self.assertEqual(metrics['stopped_workers'], 1)
+        self.assertEqual(self.service.running, {})
+
+    def test_waiting_job_is_stopped_when_started(self):
+        first, first_results = self.submit_in_thread('sleep')
+        second, second_results = self.submit_in_thread('sleep')
+        first.join()
+        second.join()
+        self.assertEqual([first_results[0]['status'],
+                          second_results[0]['status']], [504, 504])
+        self.assertEqual(self.service.submit('text', PUZZLE)['status'], 200)
+        self.assertEqual(self.service.status()['stopped_workers'], 2)
+
+    def test_only_full_service_counts_as_rejected(self):
+        self.assertEqual(self.service.submit('image', b'')['status'], 503)
+        self.assertEqual(self.service.status()['rejected'], 0)
+        threads = [self.submit_in_thread('sleep')[0] for _ in range(2)]
+        time.sleep(0.2)
+        self.assertEqual(self.service.submit('text', PUZZLE)['status'], 503)
+        self.assertEqual(self.service.status()['rejected'], 1)
+        for thread in threads:
+            thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Structured tracing for the image and solver pipeline.
+
+Every important stage (decode, grayscale, blur, threshold, find_grid, warp,
+OCR of each individual square, solve) is recorded as a span: a name, a start
+time, a duration and the size of what went in and came out. Spans are
+recorded by the traced decorator (see decorators.py) or by the span context
+manager for code that is not a single method, such as the solver call in
+main.py.
+
+Tracing is switched on with ENABLE_TRACING in settings. When it is switched
+off, the traced decorator hands back the original method untouched, so
+nothing is wrapped and nothing is paid for.
+
+Recorded spans can be exported as plain JSON or as Chrome trace events. The
+latter can be opened in chrome://tracing or https://ui.perfetto.dev.
+When ENABLE_PROFILING is set in the settings, cProfile runs alongside the
+tracer and its stats are dumped to PROFILE_OUTPUT.
+"""
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import threading
+import time
+import settings
+
+ENABLED = settings.ENABLE_TRACING
+
+# time.perf_counter does not exist in Python 2, fall back to time.time.
+clock = getattr(time, 'perf_counter', time.time)
+# All spans recorded during execution, in order of completion.
+_spans = []
+_profiler = None
+
+
+def size_of(value):
+    """ Returns a JSON friendly description of the size of a value.
+        Images (numpy arrays) are described by their shape, lists and
+        strings by their length. Anything else has no size. """
+    shape = getattr(value, 'shape', None)
+    if shape is not None:
+        return list(shape)
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def record(name, start, end, **attributes):
+    """ Stores a finished span. Start and end are values of the
+        tracing clock, in seconds. """
+    _spans.append({
+        'name': name,
+        'start': start,
+        'duration': end - start,
+        'pid': os.getpid(),
+        'tid': threading.current_thread().ident,
+        'args': attributes})
+
+
+@contextmanager
+def span(name, **attributes):
+    """ Records the code inside the with-block as a span. Does nothing
+        but yield when tracing is disabled. """
+    if not ENABLED:
+        yield attributes
+        return
+    start = clock()
+    try:
+        yield attributes
+    finally:
+        record(name, start, clock(), **attributes)
+
+
+def spans():
+    """ Returns a copy of all spans recorded so far. """
+    return list(_spans)
+
+
+def reset():
+    """ Forgets all spans recorded so far. """
+    del _spans[:]
+
+
+def to_json():
+    """ Returns the recorded spans as a list of plain dictionaries,
+        with times in milliseconds relative to the first span. """
+    if not _spans:
+        return []
+    origin = min(s['start'] for s in _spans)
+    return [{'name': s['name'],
+             'start_ms': (s['start'] - origin) * 1000.0,
+             'duration_ms': s['duration'] * 1000.0,
+             'pid': s['pid'],
+             'tid': s['tid'],
+             'args': s['args']} for s in _spans]
+
+
+def to_chrome():
+    """ Returns the recorded spans as Chrome trace events
+        ("complete" events, timestamps in microseconds). """
+    events = [{'name': s['name'],
+               'cat': 'pipeline',
+               'ph': 'X',
+               'ts': s['start'] * 1e6,
+               'dur': s['duration'] * 1e6,
+               'pid': s['pid'],
+               'tid': s['tid'],
+               'args': s['args']} for s in _spans]
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export(path=None, fmt=None):
+    """ Writes the recorded spans to the given path in the given format,
+        either 'json' or 'chrome'. Defaults to TRACE_OUTPUT and
+        TRACE_FORMAT from the settings. """
+    path = path or settings.TRACE_OUTPUT
+    fmt = fmt or settings.TRACE_FORMAT
+    if fmt == 'chrome':
+        data = to_chrome()
+    elif fmt == 'json':
+        data = to_json()
+    else:
+        raise ValueError("Unknown trace format: %s" % fmt)
+    with open(path, 'w') as trace_file:
+        json.dump(data, trace_file, indent=1)
+    if settings.ENABLE_DEBUG:
+        print("DEBUG -- %d spans written to %s." % (len(_spans), path))
+
+
+def start_profiler():
+    """ Starts cProfile if profiling has been enabled in the settings. """
+    global _profiler
+    if settings.ENABLE_PROFILING and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def stop_profiler():
+    """ Stops cProfile (if running) and dumps its stats to the
+        PROFILE_OUTPUT file from the settings. The file can be inspected
+        with the pstats module or tools such as snakeviz. """
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.disable()
+    _profiler.dump_stats(settings.PROFILE_OUTPUT)
+    _profiler = None
+    if settings.ENABLE_DEBUG:
+        print("DEBUG -- Profile written to %s." % settings.PROFILE_OUTPUT)
+
+
+def finish():
+    """ Stops the profiler and exports the trace. Meant to be registered
+        with atexit, so the results are also written when the script
+        exits early. """
+    stop_profiler()
+    if ENABLED and _spans:
+        export()